@@ -1,49 +1,166 @@
 import asyncio
+import io
+import socket
 import ssl
 import uuid
 from datetime import datetime
-from typing import Dict, List, Optional
-from email.parser import BytesParser
+from typing import Any, Dict, List, Optional, Tuple
+from email.feedparser import BytesFeedParser
+from email.message import EmailMessage as MIMEMessage
 from email import policy
+from email.utils import parsedate_to_datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import re
 
+import asyncpg
+
 from .models import SMTPCommand, SMTPResponse, EmailEnvelope, ConnectionInfo, ServerState
 from shared.config import settings
 from email_service.database import EmailDatabase
 from email_service.models import EmailMessage, EmailAddress, EmailStatus, EmailPriority
 
+# Pre-encoded wire bytes for the fixed replies this server sends
+_CANNED_RESPONSES: Dict[tuple, bytes] = {
+    (code, message): f"{code} {message}\r\n".encode('ascii')
+    for code, message in (
+        (220, "SMTP Service Ready"),
+        (214, "Help message"),
+        (221, "Bye"),
+        (250, "OK"),
+        (250, "Reset OK"),
+        (250, "Sender OK"),
+        (250, "Recipient OK"),
+        (250, "Message accepted for delivery"),
+        (252, "User not verified"),
+        (252, "List not expanded"),
+        (354, "End data with <CR><LF>.<CR><LF>"),
+        (500, "Invalid command"),
+        (500, "Unknown command"),
+        (500, "Internal server error - timeout"),
+        (500, "Internal server error - no envelope"),
+        (500, "Error reading email data"),
+        (501, "Sender address required"),
+        (501, "Recipient address required"),
+        (503, "Sender already specified"),
+        (503, "Need MAIL command"),
+        (503, "Need RCPT command"),
+        (552, "Message size exceeds fixed maximum message size"),
+    )
+}
+
+
+class SMTPMessageTooLarge(Exception):
+    """Raised when a DATA body exceeds the configured maximum message size"""
+
+
+# StreamReader buffer limit; DATA bodies are scanned with readuntil()
+_READER_LIMIT = 16 * 1024 * 1024
+
+# RFC 5321 text line limit (with CRLF); a longer partial line is not held back between reads
+_MAX_LINE_BYTES = 1000
+
+
+def _unstuff_dots(block: bytes, at_line_start: bool = True) -> bytes:
+    """Undo RFC 5321 dot-stuffing on a run of lines (the first may continue an earlier one)"""
+    if at_line_start and block.startswith(b".."):
+        block = block[1:]
+    return block.replace(b"\r\n..", b"\r\n.")
+
+
+class MockUploadFile:
+    """Minimal UploadFile stand-in so parsed attachments can reuse the upload path"""
+    
+    def __init__(self, content: bytes, filename: str, content_type: str):
+        self.file = io.BytesIO(content)
+        self.filename = filename
+        self.content_type = content_type
+        self.size = len(content)
+    
+    async def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+    
+    async def close(self):
+        self.file.close()
+
+
+_ATTACHMENT_MAINTYPES = frozenset({'image', 'application', 'audio', 'video'})
+
+
+def _iter_leaf_parts(message):
+    """Yield the non-multipart parts of a parsed message, depth first"""
+    for part in message.get_payload():
+        if part.is_multipart():
+            yield from _iter_leaf_parts(part)
+        else:
+            yield part
+
 
 class SMTPReceiveServer:
     def __init__(self):
-        self.connections: Dict[str, ConnectionInfo] = {}
-        self.parser = BytesParser(policy=policy.default)
         # Use existing user ID from database
         self.default_user_id = "d75bbc95-08d7-4805-880c-24a6b6078636"
+        # Native asyncpg pool for user lookups (created lazily on first use)
+        self.db_pool: Optional[asyncpg.Pool] = None
+        self._db_pool_lock = asyncio.Lock()
+        
+    async def _get_db_pool(self) -> Optional[asyncpg.Pool]:
+        """Get the asyncpg pool, or None when no direct Postgres DSN is configured"""
+        if self.db_pool is None and settings.SUPABASE_DB_URL:
+            async with self._db_pool_lock:
+                if self.db_pool is None:
+                    self.db_pool = await asyncpg.create_pool(
+                        settings.SUPABASE_DB_URL,
+                        min_size=2,
+                        max_size=10,
+                        statement_cache_size=100
+                    )
+        return self.db_pool
+    
+    async def _fetch_user_row(self, columns: str, clean_email: str) -> Optional[Dict[str, Any]]:
+        """Look up a single user row by email, preferring asyncpg over the Supabase HTTP API"""
+        pool = await self._get_db_pool()
+        if pool is not None:
+            async with pool.acquire() as conn:
+                # Prepared statement is cached per connection (statement_cache_size)
+                row = await conn.fetchrow(f"SELECT {columns} FROM users WHERE email = $1", clean_email)
+            return dict(row) if row else None
+        
+        # Fallback: sync Supabase client on the default executor
+        from shared.database import get_supabase
+        supabase = get_supabase()
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            None, lambda: supabase.table('users').select(columns).eq('email', clean_email).execute()
+        )
+        return response.data[0] if response.data else None
         
     async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         """Handle a new SMTP connection"""
-        client_id = str(uuid.uuid4())
         client_addr = writer.get_extra_info('peername')
+        self._tune_transport(writer)
         
-        # Initialize connection info
-        self.connections[client_id] = ConnectionInfo(
-            client_id=client_id,
-            created_at=datetime.utcnow(),
-            last_activity=datetime.utcnow()
+        # Per-connection state lives with the coroutine, not in a shared dict
+        now = datetime.utcnow()
+        conn_info = ConnectionInfo(
+            client_id=str(client_addr),
+            created_at=now,
+            last_activity=now
         )
         
         current_envelope = None
+        # Read of the next command line, started early to detect pipelined input
+        next_line = None
         
         try:
             # Send greeting
-            await self._send_response(writer, 220, f"SMTP Service Ready")
+            await self._send_response(writer, 220, "SMTP Service Ready")
             
             while True:
                 # Read command
                 print(f"🔍 Waiting for command...")
-                line = await reader.readline()
+                line = await (next_line or reader.readline())
+                next_line = None
                 if not line:
                     print("❌ No data received from client")
                     break
@@ -55,7 +172,7 @@ class SMTPReceiveServer:
                     continue
                 
                 # Update last activity
-                self.connections[client_id].last_activity = datetime.utcnow()
+                conn_info.last_activity = datetime.utcnow()
                 
                 # Parse command (minimal logging for performance)
                 command = self._parse_command(line_str)
@@ -64,11 +181,14 @@ class SMTPReceiveServer:
                     if len(line_str) > 50 and line_str.replace('+', '').replace('/', '').replace('=', '').isalnum():
                         print("❌ Base64 data detected - disconnecting client")
                         break
-                    await self._send_response(writer, 500, "Invalid command")
+                    self._queue_response(writer, 500, "Invalid command")
+                    next_line, pipelined = await self._read_ahead(reader)
+                    if not pipelined:
+                        await self._flush(writer)
                     continue
                 
                 # Process command (minimal logging)
-                response = await self._process_command(client_id, command, current_envelope)
+                response = await self._process_command(command, current_envelope)
                 # Only log errors and important commands
                 if response.code >= 400 or command.command in ['DATA', 'QUIT']:
                     print(f"📧 {command.command}: {response.code} {response.message}")
@@ -95,30 +215,26 @@ class SMTPReceiveServer:
                     
                 # Handle DATA command specially
                 elif command.command == "DATA" and response.code == 354:
-                    # Send 354 response first
-                    await self._send_response(writer, response.code, response.message)
+                    # Send 354 response first; the client waits for it before sending the body
+                    self._queue_response(writer, response.code, response.message)
+                    await self._flush(writer)
                     print("🔍 About to read email data after sending 354 response...")
                     try:
                         # Read email data with better error handling
-                        email_data = await self._read_email_data(reader)
-                        print(f"🔍 Email data reading completed, got {len(email_data)} bytes")
+                        email_message = await self._read_email_data(reader)
                         if current_envelope:
-                            current_envelope.data = email_data
                             # Process and store the email with timeout
                             try:
-                                import asyncio
-                                await asyncio.wait_for(self._process_email(current_envelope), timeout=30.0)
+                                await asyncio.wait_for(self._process_email(current_envelope, email_message), timeout=30.0)
                                 current_envelope = None
                                 # Send success response after processing
                                 print("🔍 Sending 250 success response...")
-                                await self._send_response(writer, 250, "Message accepted for delivery")
+                                self._queue_response(writer, 250, "Message accepted for delivery")
+                                await self._flush(writer)
                                 
                                 # After successful email processing, expect either QUIT or new MAIL command
                                 print("🔍 Email transaction completed successfully")
                                 
-                                # Small delay to allow client to send QUIT command
-                                await asyncio.sleep(0.1)
-                                
                             except asyncio.TimeoutError:
                                 print("❌ Timeout processing email")
                                 await self._send_response(writer, 500, "Internal server error - timeout")
@@ -126,26 +242,45 @@ class SMTPReceiveServer:
                         else:
                             print("❌ No current envelope for DATA command")
                             await self._send_response(writer, 500, "Internal server error - no envelope")
+                    except SMTPMessageTooLarge as size_error:
+                        print(f"❌ Rejected email data: {size_error}")
+                        await self._send_response(writer, 552, "Message size exceeds fixed maximum message size")
+                        current_envelope = None
                     except Exception as data_error:
                         print(f"❌ Error reading email data: {data_error}")
                         await self._send_response(writer, 500, "Error reading email data")
                         current_envelope = None
                     continue  # Skip normal response sending for DATA command
                 else:
-                    # Send normal response for all other commands
-                    await self._send_response(writer, response.code, response.message)
+                    # Queue normal responses; with pipelined commands only the
+                    # last reply of the batch waits on drain()
+                    self._queue_response(writer, response.code, response.message)
+                    next_line, pipelined = await self._read_ahead(reader)
+                    if not pipelined:
+                        await self._flush(writer)
                 
         except Exception as e:
             print(f"❌ SMTP connection error: {e}")
             import traceback
             traceback.print_exc()
         finally:
-            # Clean up connection
-            if client_id in self.connections:
-                del self.connections[client_id]
+            if next_line:
+                next_line.cancel()
             writer.close()
             await writer.wait_closed()
     
+    @staticmethod
+    def _tune_transport(writer: asyncio.StreamWriter):
+        """Disable Nagle and make drain() return once replies reach the kernel"""
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError:
+                pass  # Not a TCP socket
+        # SMTP replies are tiny; high=0 keeps drain() from waiting on a 64KiB buffer
+        writer.transport.set_write_buffer_limits(high=0)
+    
     def _clean_email_address(self, address: str) -> str:
         """Clean up email address from SMTP command format"""
         if not address:
@@ -193,10 +328,8 @@ class SMTPReceiveServer:
             print(f"❌ Error parsing command: {e}")
             return None
     
-    async def _process_command(self, client_id: str, command: SMTPCommand, current_envelope: Optional[EmailEnvelope]) -> SMTPResponse:
+    async def _process_command(self, command: SMTPCommand, current_envelope: Optional[EmailEnvelope]) -> SMTPResponse:
         """Process SMTP command"""
-        conn_info = self.connections[client_id]
-        
         if command.command == "HELO" or command.command == "EHLO":
             return SMTPResponse(code=250, message=f"localhost Hello {command.arguments[0] if command.arguments else 'unknown'}")
         elif command.command == "MAIL":
@@ -267,106 +400,102 @@ class SMTPReceiveServer:
         print(f"✅ DATA command valid, returning 354 response")
         return SMTPResponse(code=354, message="End data with <CR><LF>.<CR><LF>")
     
-    async def _read_email_data(self, reader: asyncio.StreamReader) -> bytes:
-        """Read email data until end marker"""
-        data = b""
-        line_count = 0
-        try:
-            import asyncio
-            print("🔍 Starting to read email data...")
-            while True:
-                # Read line with timeout (minimal logging for performance)
-                line = await asyncio.wait_for(reader.readline(), timeout=10.0)
-                line_count += 1
-                
-                if not line:
-                    if line_count > 100:  # Only log for substantial emails
-                        print(f"🔍 Finished reading email data: {line_count} lines")
-                    break
-                
-                # Only log progress for very large emails (reduce I/O overhead)
-                # if line_count > 0 and line_count % 1000 == 0:
-                #     print(f"🔍 Reading large email: {line_count} lines processed...")
-                
-                # Check for end marker (SMTP DATA termination: single dot on its own line)
-                if line.strip() == b".":
-                    print("🔍 Found end marker '.' - email data complete")
-                    break
-                
-                # Remove leading dot if present (dot stuffing per RFC 5321)
-                if line.startswith(b".."):
-                    line = b"." + line[2:]  # Convert ".." back to "."
-                
-                data += line
-                
-                # Safety check to prevent runaway emails (increase limit significantly)
-                if line_count > 50000:  # Allow much larger emails with attachments
-                    print(f"❌ Email too large ({line_count} lines), breaking")
-                    break
-                    
-        except asyncio.TimeoutError:
-            print(f"❌ Timeout reading email data after {line_count} lines")
-            return data
-        except Exception as e:
-            print(f"❌ Error reading email data: {e}")
-            return data
+    async def _read_email_data(self, reader: asyncio.StreamReader) -> MIMEMessage:
+        """Read email data until the <CRLF>.<CRLF> end marker, parsing it as it arrives"""
+        feed = BytesFeedParser(policy=policy.default)
+        carry = b""  # trailing partial line left over from an oversized read
+        at_line_start = True  # whether carry + the next read begins a new line
+        total = 0
+        too_large = False
+        max_bytes = settings.smtp_max_message_bytes
+        print("🔍 Starting to read email data...")
+        while True:
+            try:
+                # Let asyncio scan its buffer for ".\r\n" in C; only lines ending in
+                # a dot stop the scan, so most of the body arrives in one await
+                raw = await asyncio.wait_for(reader.readuntil(b".\r\n"), timeout=30.0)
+                block = carry + raw
+                carry = b""
+                block_at_line_start = at_line_start
+                # A lone "." line ends the body
+                done = block.endswith(b"\n.\r\n") or (block == b".\r\n" and at_line_start)
+                if done:
+                    block = block[:-3]
+                at_line_start = True
+            except asyncio.LimitOverrunError as e:
+                # No marker within the reader limit: consume what is buffered and
+                # hold back the trailing partial line for the next block
+                raw = await reader.readexactly(e.consumed)
+                block = carry + raw
+                block_at_line_start = at_line_start
+                cut = block.rfind(b"\n") + 1
+                block, carry = block[:cut], block[cut:]
+                if cut:
+                    at_line_start = True
+                done = False
+            
+            total += len(raw)
+            if total > max_bytes:
+                # Keep consuming up to the end marker so the session stays in sync,
+                # but stop buffering the oversized message
+                too_large = True
+            elif block:
+                # Parse incrementally instead of buffering the whole body first
+                feed.feed(_unstuff_dots(block, block_at_line_start))
+            
+            if carry and (too_large or len(carry) > _MAX_LINE_BYTES):
+                # Never hold an over-long partial line: parse it now (or drop it once the
+                # message is rejected) so memory stays bounded; it holds no "\n", so the
+                # end marker can still only be found in later reads
+                if not too_large:
+                    feed.feed(_unstuff_dots(carry, at_line_start))
+                carry = b""
+                at_line_start = False
+            
+            if done:
+                print("🔍 Found end marker '.' - email data complete")
+                break
         
-        print(f"🔍 Email data reading completed: {len(data)} bytes total from {line_count} lines")
+        if too_large:
+            raise SMTPMessageTooLarge(f"Message exceeds {max_bytes} bytes")
         
-        # Ensure we've consumed all the email data properly
-        try:
-            # Check if there's any immediate data available that might cause protocol issues
-            if reader.at_eof():
-                print("🔍 Reader is at EOF - no more data")
-            else:
-                # Peek at buffer without consuming to see if there's unexpected data
-                buffered = len(reader._buffer) if hasattr(reader, '_buffer') else 0
-                if buffered > 0:
-                    print(f"⚠️ Warning: {buffered} bytes still in buffer after email data")
-        except:
-            pass  # Ignore errors in buffer inspection
-            
-        return data
+        print(f"🔍 Email data reading completed: {total} bytes total")
+        
+        if reader.at_eof():
+            print("🔍 Reader is at EOF - no more data")
+        
+        return feed.close()
     
-    async def _process_email(self, envelope: EmailEnvelope):
+    async def _process_email(self, envelope: EmailEnvelope, email_message: MIMEMessage):
         """Process and store received email"""
         try:
-            # Debug: Print raw email data
-            print(f"🔍 Raw email data length: {len(envelope.data)} bytes")
-            print(f"🔍 Raw email data (first 500 chars): {envelope.data[:500]}")
-            
-            # Parse email
-            email_message = self.parser.parsebytes(envelope.data)
-            
-            # Debug: Print all headers
-            print(f"🔍 Email headers: {dict(email_message.items())}")
-            
-            # Extract email components
-            subject = email_message.get('Subject', 'No Subject')
-            from_header = email_message.get('From', '')
-            to_header = email_message.get('To', '')
-            cc_header = email_message.get('Cc', '')
-            date_header = email_message.get('Date', '')
+            # Extract email components (only the headers we need get decoded)
+            subject = email_message['Subject'] or 'No Subject'
+            from_header = email_message['From'] or ''
+            to_header = email_message['To'] or ''
+            cc_header = email_message['Cc'] or ''
+            date_header = email_message['Date'] or ''
             
             print(f"🔍 Parsed subject: '{subject}'")
             print(f"🔍 Parsed from: '{from_header}'")
             print(f"🔍 Parsed to: '{to_header}'")
             
-            # Parse addresses with error handling
+            # Parse addresses with error handling (inbound senders are almost
+            # never local users, so skip the users-table enrichment lookup)
             try:
-                from_address = self._parse_email_address(from_header)
+                from_address = await self._parse_email_address(from_header, enrich=False)
             except Exception as e:
                 print(f"Error parsing From address '{from_header}': {e}")
                 from_address = EmailAddress(email="unknown@example.com", name="Unknown")
             
             try:
-                to_addresses = self._parse_email_addresses(to_header)
+                to_addresses = await self._parse_email_addresses(to_header, enrich=False)
             except Exception as e:
                 print(f"Error parsing To addresses '{to_header}': {e}")
                 to_addresses = []
             
             try:
-                cc_addresses = self._parse_email_addresses(cc_header)
+                cc_addresses = await self._parse_email_addresses(cc_header, enrich=False)
             except Exception as e:
                 print(f"Error parsing Cc addresses '{cc_header}': {e}")
                 cc_addresses = []
@@ -377,15 +506,15 @@ class SMTPReceiveServer:
             attachments = []
             
             if email_message.is_multipart():
-                for part in email_message.walk():
-                    if part.get_content_maintype() == 'multipart':
-                        continue
-                    if part.get_content_maintype() == 'text':
-                        if part.get_content_subtype() == 'plain':
+                for part in _iter_leaf_parts(email_message):
+                    maintype = part.get_content_maintype()
+                    if maintype == 'text':
+                        subtype = part.get_content_subtype()
+                        if subtype == 'plain':
                             body = part.get_content()
-                        elif part.get_content_subtype() == 'html':
+                        elif subtype == 'html':
                             html_body = part.get_content()
-                    elif part.get_content_maintype() in ['image', 'application', 'audio', 'video']:
+                    elif maintype in _ATTACHMENT_MAINTYPES:
                         # This is an attachment
                         filename = part.get_filename()
                         if filename:
@@ -401,19 +530,6 @@ class SMTPReceiveServer:
                             try:
                                 from email_service.attachment_handler import attachment_handler
                                 
-                                # Create a mock UploadFile object
-                                class MockUploadFile:
-                                    def __init__(self, content, filename, content_type):
-                                        self.content = content
-                                        self.filename = filename
-                                        self.content_type = content_type
-                                        self.size = len(content)
-                                    
-                                    async def read(self):
-                                        return self.content
-                                
-                                mock_file = MockUploadFile(content, filename, content_type)
-                                
                                 # Save attachment using a temporary user ID (we'll process this per recipient later)
                                 temp_attachment_data = {
                                     'content': content,
@@ -429,16 +545,18 @@ class SMTPReceiveServer:
             else:
                 body = email_message.get_content()
             
-            # Parse date
+            # Parse date (RFC 5322 format, e.g. "Tue, 15 Mar 2024 09:41:22 -0500")
             try:
-                received_date = datetime.fromisoformat(date_header.replace('Z', '+00:00')) if date_header else envelope.received_at
-            except:
+                received_date = parsedate_to_datetime(date_header) if date_header else envelope.received_at
+            except (TypeError, ValueError):
+                # Malformed Date header
                 received_date = envelope.received_at
             
             # Convert datetime to ISO string for JSON serialization
             received_date_str = received_date.isoformat() if isinstance(received_date, datetime) else received_date
             
-            # Store email for each recipient
+            # Build one row per recipient, then store them all with batched inserts
+            pending_emails = []
             for recipient in envelope.recipients:
                 print(f"🔍 Processing email for recipient: {recipient}")
                 
@@ -459,17 +577,7 @@ class SMTPReceiveServer:
                     
                     for attachment in attachments:
                         try:
-                            # Create a mock UploadFile object for each attachment
-                            class MockUploadFile:
-                                def __init__(self, content, filename, content_type):
-                                    self.content = content
-                                    self.filename = filename
-                                    self.content_type = content_type
-                                    self.size = len(content)
-                                
-                                async def read(self):
-                                    return self.content
-                            
+                            # Wrap the attachment bytes in an UploadFile-like object
                             mock_file = MockUploadFile(
                                 attachment['content'], 
                                 attachment['filename'], 
@@ -502,11 +610,13 @@ class SMTPReceiveServer:
                     "received_at": received_date_str
                 }
                 
-                # Store in database
-                print(f"💾 Storing email in database for user_id: {user_id} with {len(recipient_attachments)} attachments")
-                await EmailDatabase.create_email(email_data, user_id)
-                
-                print(f"✅ Email stored successfully for {recipient}: {subject}")
+                print(f"💾 Queued email for user_id: {user_id} with {len(recipient_attachments)} attachments")
+                pending_emails.append((email_data, user_id))
+            
+            # Store in database
+            if pending_emails:
+                stored = await EmailDatabase.create_emails(pending_emails)
+                print(f"✅ Email stored successfully for {len(stored)} recipients: {subject}")
                 
         except Exception as e:
             print(f"❌ Error processing email: {e}")
@@ -515,8 +625,8 @@ class SMTPReceiveServer:
             # Re-raise the exception to prevent hanging
             raise
     
-    def _parse_email_address(self, address_string: str) -> EmailAddress:
-        """Parse email address from string"""
+    async def _parse_email_address(self, address_string: str, enrich: bool = False) -> EmailAddress:
+        """Parse email address from string, optionally enriching the name from the users table"""
         # Handle empty or invalid addresses
         if not address_string or not address_string.strip():
             return EmailAddress(email="unknown@example.com", name="Unknown")
@@ -536,19 +646,19 @@ class SMTPReceiveServer:
             email = "unknown@example.com"
             name = "Unknown"
         
+        if not enrich:
+            return EmailAddress(email=email, name=name)
+        
         # Try to enrich the name with user data from database
         try:
-            from shared.database import get_supabase
-            supabase = get_supabase()
             clean_email = self._clean_email_address(email)
             
             # Look up user by email
-            response = supabase.table('users').select('first_name,last_name,email').eq('email', clean_email).execute()
+            user_data = await self._fetch_user_row("first_name, last_name, email", clean_email)
             
-            if response.data:
-                user_data = response.data[0]
-                first_name = user_data.get("first_name", "")
-                last_name = user_data.get("last_name", "")
+            if user_data:
+                first_name = user_data.get("first_name") or ""
+                last_name = user_data.get("last_name") or ""
                 full_name = f"{first_name} {last_name}".strip()
                 if full_name:
                     name = full_name
@@ -559,7 +669,7 @@ class SMTPReceiveServer:
         
         return EmailAddress(email=email, name=name)
     
-    def _parse_email_addresses(self, addresses_string: str) -> List[EmailAddress]:
+    async def _parse_email_addresses(self, addresses_string: str, enrich: bool = False) -> List[EmailAddress]:
         """Parse multiple email addresses from string"""
         if not addresses_string or not addresses_string.strip():
             return []
@@ -570,7 +680,7 @@ class SMTPReceiveServer:
             addr = addr.strip()
             if addr:  # Only process non-empty addresses
                 try:
-                    addresses.append(self._parse_email_address(addr))
+                    addresses.append(await self._parse_email_address(addr, enrich=enrich))
                 except Exception:
                     # Skip invalid addresses
                     continue
@@ -580,25 +690,16 @@ class SMTPReceiveServer:
     async def _get_user_id_by_email(self, email: str) -> Optional[str]:
         """Get user ID by email address"""
         try:
-            import asyncio
-            from shared.database import get_supabase
-            supabase = get_supabase()
-            
             # Clean the email address
             clean_email = self._clean_email_address(email)
             print(f"🔍 Looking up user for email: '{email}' -> cleaned: '{clean_email}'")
             
             # Look up user by email with timeout
             try:
-                # Run the database query with a timeout
-                loop = asyncio.get_event_loop()
-                response = await asyncio.wait_for(
-                    loop.run_in_executor(None, lambda: supabase.table('users').select('id').eq('email', clean_email).execute()),
-                    timeout=5.0
-                )
+                user_data = await asyncio.wait_for(self._fetch_user_row("id", clean_email), timeout=5.0)
                 
-                if response.data:
-                    user_id = response.data[0]['id']
+                if user_data:
+                    user_id = str(user_data['id'])
                     print(f"✅ Found user_id: {user_id} for email: {clean_email}")
                     return user_id
                 else:
@@ -612,11 +713,28 @@ class SMTPReceiveServer:
             print(f"❌ Error looking up user by email {email}: {e}")
             return None
 
+    def _queue_response(self, writer: asyncio.StreamWriter, code: int, message: str):
+        """Write an SMTP response to the transport without waiting for it to drain"""
+        response = _CANNED_RESPONSES.get((code, message)) or f"{code} {message}\r\n".encode('utf-8')
+        writer.write(response)
+    
+    async def _flush(self, writer: asyncio.StreamWriter):
+        """Wait for queued responses to be handed to the transport"""
+        await writer.drain()
+    
+    @staticmethod
+    async def _read_ahead(reader: asyncio.StreamReader) -> Tuple[asyncio.Future, bool]:
+        """Start reading the next command line; also report whether it was already received (pipelined)"""
+        # A line already in the reader's buffer completes in the read's first step, which runs
+        # during this one yield; otherwise the read is still waiting on the socket
+        next_line = asyncio.ensure_future(reader.readline())
+        await asyncio.sleep(0)
+        return next_line, next_line.done()
+    
     async def _send_response(self, writer: asyncio.StreamWriter, code: int, message: str):
         """Send SMTP response to client"""
-        response = f"{code} {message}\r\n"
-        writer.write(response.encode('utf-8'))
-        await writer.drain()
+        self._queue_response(writer, code, message)
+        await self._flush(writer)
     
     async def start_server(self):
         """Start the SMTP receive server"""
@@ -634,10 +752,10 @@ class SMTPReceiveServer:
         
         if settings.smtp_receive_use_ssl:
             server = await asyncio.start_server(
-                handle_client, host, port, ssl=ssl_context
+                handle_client, host, port, ssl=ssl_context, limit=_READER_LIMIT
             )
         else:
-            server = await asyncio.start_server(handle_client, host, port)
+            server = await asyncio.start_server(handle_client, host, port, limit=_READER_LIMIT)
         
         print(f"SMTP receive server running on {host}:{port}")
         
@@ -1,96 +1,436 @@
 import os
 import uuid
-import aiofiles
-from typing import List, Optional, Dict, Any
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, List, Optional, Dict, Any
 from fastapi import UploadFile, HTTPException
-from datetime import datetime
+from datetime import datetime, timezone
 import mimetypes
 from pathlib import Path
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from shared.config import settings
+from shared.database import get_supabase
 import boto3
+import redis
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Pool sized to match the executor so concurrent calls reuse keep-alive connections
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    tcp_keepalive=True,
+    retries={'max_attempts': 5, 'mode': 'adaptive'}
+)
+
+# Multipart, parallel-part uploads streamed straight from the upload's spooled file
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10
+)
+
+# Presigned URLs are long-lived and reused for a whole signing window, so the
+# same attachment keeps the same URL and browsers/CDNs can cache the response
+PRESIGNED_URL_EXPIRES = 7 * 24 * 3600  # 7 days, the SigV4 maximum
+PRESIGNED_URL_WINDOW = 3600  # 1 hour
+PRESIGNED_URL_CACHE_SIZE = 10000
+
+# list_objects_v2 fallback lookups are cached briefly per prefix
+LIST_CACHE_TTL = 30
+LIST_CACHE_SIZE = 10000
+
+# Maximum keys per S3 delete_objects request
+S3_DELETE_BATCH_SIZE = 1000
+
+# Chunk size for streaming uploads to local storage
+LOCAL_WRITE_CHUNK_SIZE = 1024 * 1024
+
+# Chunk size for streaming attachment downloads
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Upper bound on concurrent uploads in save_multiple_attachments
+MAX_CONCURRENT_UPLOADS = 8
+
+
+# Content types browsers can preview, served inline; everything else downloads
+_INLINE_PREFIXES = ('image/', 'text/')
+_INLINE_TYPES = frozenset({'application/pdf', 'application/json', 'application/xml'})
+
+# Load the system MIME tables once at import rather than on the first request
+mimetypes.init()
+
+# Extensions common in mail, answered without going through mimetypes
+_EXT_TO_CONTENT_TYPE = {
+    '.pdf': 'application/pdf',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.txt': 'text/plain',
+    '.csv': 'text/csv',
+    '.zip': 'application/zip',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xls': 'application/vnd.ms-excel',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+
+
+def _guess_content_type(filename: str) -> str:
+    """Guess a content type from a filename, defaulting to application/octet-stream"""
+    ext = os.path.splitext(filename)[1].lower()
+    return _EXT_TO_CONTENT_TYPE.get(ext) or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def _disposition(content_type: str, filename: str) -> str:
+    """Content-Disposition header value for serving an attachment"""
+    kind = 'inline' if content_type.startswith(_INLINE_PREFIXES) or content_type in _INLINE_TYPES else 'attachment'
+    return f'{kind}; filename="{filename}"'
+
+
+def _save_local(path: Path, src, limit: int) -> int:
+    """Copy src to path in chunks, stopping once more than limit bytes were read; returns bytes read"""
+    written = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = src.read(LOCAL_WRITE_CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > limit:
+                break
+            f.write(chunk)
+    return written
+
+
 class AttachmentHandler:
     def __init__(self):
         self.upload_dir = Path("uploads/attachments")
         self.upload_dir.mkdir(parents=True, exist_ok=True)
         
-        # Initialize S3 client if configured
-        self.s3_client = None
+        # User upload dirs already created by this process (they are never removed at runtime)
+        self._known_dirs: set = set()
+        
+        # Dedicated pool so blocking boto3 calls never run on the event loop
+        self._executor = ThreadPoolExecutor(max_workers=32)
+        
+        # LRU of presigned URLs: (key, type, disposition, window) -> url
+        self._url_cache: "OrderedDict[tuple, str]" = OrderedDict()
+        
+        # Short-lived cache of list-prefix lookups: prefix -> (s3_key or None, expires_at)
+        self._list_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        
+        # Redis index of attachment_id -> stored filename (lazy, optional)
+        self._redis_client = None
+        self._redis_checked = False
+        
+        # Supabase client for the attachments metadata table (lazy, optional)
+        self._db = None
+        self._db_checked = False
+    
+    @functools.cached_property
+    def s3_client(self):
+        """S3 client if configured, created on first use"""
         if hasattr(settings, 'AWS_ACCESS_KEY_ID') and settings.AWS_ACCESS_KEY_ID:
-            self.s3_client = boto3.client(
+            return boto3.client(
                 's3',
                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
                 aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION
+                region_name=settings.AWS_REGION,
+                config=S3_CLIENT_CONFIG
+            )
+        return None
+    
+    async def _s3(self, method: str, **kwargs):
+        """Run a blocking S3 client method on the handler's thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(getattr(self.s3_client, method), **kwargs)
+        )
+    
+    def _get_redis_client(self):
+        """Get Redis client with lazy initialization"""
+        if not self._redis_checked:
+            self._redis_checked = True
+            try:
+                self._redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+                self._redis_client.ping()
+            except Exception as e:
+                logger.warning(f"Redis unavailable for attachment index: {e}")
+                self._redis_client = None
+        return self._redis_client
+    
+    def _get_db(self):
+        """Get Supabase client with lazy initialization"""
+        if not self._db_checked:
+            self._db_checked = True
+            try:
+                self._db = get_supabase()
+            except Exception as e:
+                logger.warning(f"Supabase unavailable for attachment records: {e}")
+                self._db = None
+        return self._db
+    
+    async def _db_call(self, query):
+        """Execute a Supabase query builder on the handler's thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, query.execute)
+    
+    async def _save_record(self, attachment: Dict[str, Any], user_id: str, stored_filename: str) -> bool:
+        """Persist attachment metadata so lookups are a single primary-key fetch; returns whether it was stored"""
+        db = self._get_db()
+        if not db:
+            return False
+        try:
+            await self._db_call(db.table("attachments").insert({
+                "id": attachment["id"],
+                "user_id": user_id,
+                "stored_filename": stored_filename,
+                "filename": attachment["filename"],
+                "content_type": attachment["content_type"],
+                "size": attachment["size"],
+                "created_at": attachment["uploaded_at"]
+            }))
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to record attachment {attachment['id']}: {e}")
+            return False
+    
+    async def _get_record(self, attachment_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch an attachment's metadata row, if one was recorded"""
+        db = self._get_db()
+        if not db:
+            return None
+        try:
+            result = await self._db_call(
+                db.table("attachments").select("*").eq("id", attachment_id).eq("user_id", user_id).limit(1)
+            )
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.warning(f"Failed to read attachment record {attachment_id}: {e}")
+            return None
+    
+    async def _recorded_filenames(self, attachment_ids: List[str], user_id: str) -> Dict[str, str]:
+        """Stored filenames for many attachments from their metadata rows, in one query"""
+        db = self._get_db()
+        if not db or not attachment_ids:
+            return {}
+        try:
+            result = await self._db_call(
+                db.table("attachments").select("id,stored_filename").in_("id", attachment_ids).eq("user_id", user_id)
             )
+            return {record["id"]: record["stored_filename"] for record in result.data}
+        except Exception as e:
+            logger.warning(f"Failed to read attachment records: {e}")
+            return {}
+    
+    async def _delete_record(self, attachment_id: str, user_id: str):
+        """Remove an attachment's metadata row"""
+        db = self._get_db()
+        if not db:
+            return
+        try:
+            await self._db_call(db.table("attachments").delete().eq("id", attachment_id).eq("user_id", user_id))
+        except Exception as e:
+            logger.warning(f"Failed to delete attachment record {attachment_id}: {e}")
+    
+    @staticmethod
+    def _index_key(user_id: str, attachment_id: str) -> str:
+        """Redis key holding the stored filename for an attachment"""
+        return f"attachment_file:{user_id}:{attachment_id}"
+    
+    def _remember_filename(self, user_id: str, attachment_id: str, stored_filename: str):
+        """Record the stored filename (id + extension) so lookups don't need a listing"""
+        redis_client = self._get_redis_client()
+        if redis_client:
+            try:
+                redis_client.set(self._index_key(user_id, attachment_id), stored_filename)
+            except Exception as e:
+                logger.warning(f"Failed to index attachment {attachment_id}: {e}")
+    
+    def _stored_filename(self, user_id: str, attachment_id: str) -> Optional[str]:
+        """Look up the stored filename for an attachment in the index"""
+        redis_client = self._get_redis_client()
+        if redis_client:
+            try:
+                return redis_client.get(self._index_key(user_id, attachment_id))
+            except Exception as e:
+                logger.warning(f"Failed to read attachment index for {attachment_id}: {e}")
+        return None
+    
+    def _forget_filename(self, user_id: str, attachment_id: str):
+        """Drop an attachment from the index"""
+        redis_client = self._get_redis_client()
+        if redis_client:
+            try:
+                redis_client.delete(self._index_key(user_id, attachment_id))
+            except Exception as e:
+                logger.warning(f"Failed to remove attachment index for {attachment_id}: {e}")
+    
+    async def _resolve_s3_key(self, attachment_id: str, user_id: str) -> Optional[str]:
+        """Resolve the S3 key for an attachment from its metadata row, or the legacy lookup if it has none"""
+        record = await self._get_record(attachment_id, user_id)
+        if record:
+            return f"attachments/{user_id}/{record['stored_filename']}"
+        return await self._legacy_s3_key(attachment_id, user_id)
+    
+    async def _resolve_local_path(self, attachment_id: str, user_id: str) -> Optional[Path]:
+        """Resolve the local file for an attachment from its metadata row, or the legacy lookup if it has none"""
+        record = await self._get_record(attachment_id, user_id)
+        if record:
+            file_path = self.upload_dir / user_id / record['stored_filename']
+            return file_path if file_path.is_file() else None
+        return self._legacy_local_path(attachment_id, user_id)
+    
+    async def _resolve_s3_keys(self, attachment_ids: List[str], user_id: str) -> List[Optional[str]]:
+        """Resolve many S3 keys with one metadata query; only unrecorded attachments fall back to the legacy lookup"""
+        recorded = await self._recorded_filenames(attachment_ids, user_id)
+        
+        async def resolve(attachment_id: str) -> Optional[str]:
+            if attachment_id in recorded:
+                return f"attachments/{user_id}/{recorded[attachment_id]}"
+            return await self._legacy_s3_key(attachment_id, user_id)
+        
+        return await asyncio.gather(*(resolve(attachment_id) for attachment_id in attachment_ids))
+    
+    async def _resolve_local_paths(self, attachment_ids: List[str], user_id: str) -> List[Optional[Path]]:
+        """Resolve many local files with one metadata query; only unrecorded attachments fall back to the legacy lookup"""
+        recorded = await self._recorded_filenames(attachment_ids, user_id)
+        paths = []
+        for attachment_id in attachment_ids:
+            if attachment_id in recorded:
+                file_path = self.upload_dir / user_id / recorded[attachment_id]
+                paths.append(file_path if file_path.is_file() else None)
+            else:
+                paths.append(self._legacy_local_path(attachment_id, user_id))
+        return paths
+    
+    async def _legacy_s3_key(self, attachment_id: str, user_id: str) -> Optional[str]:
+        """S3 key for an attachment without a metadata row: the filename index, else a prefix listing"""
+        stored_filename = self._stored_filename(user_id, attachment_id)
+        if stored_filename:
+            return f"attachments/{user_id}/{stored_filename}"
+        
+        prefix = f"attachments/{user_id}/{attachment_id}"
+        cached = self._list_cache.get(prefix)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        
+        response = await self._s3(
+            'list_objects_v2',
+            Bucket=settings.S3_BUCKET,
+            Prefix=prefix
+        )
+        s3_key = None
+        if 'Contents' in response and len(response['Contents']) > 0:
+            s3_key = response['Contents'][0]['Key']
+            self._remember_filename(user_id, attachment_id, s3_key.rsplit('/', 1)[-1])
+        
+        self._list_cache[prefix] = (s3_key, time.monotonic() + LIST_CACHE_TTL)
+        self._list_cache.move_to_end(prefix)
+        if len(self._list_cache) > LIST_CACHE_SIZE:
+            self._list_cache.popitem(last=False)
+        return s3_key
+    
+    def _legacy_local_path(self, attachment_id: str, user_id: str) -> Optional[Path]:
+        """Local file for an attachment without a metadata row: the filename index, else a directory scan"""
+        user_upload_dir = self.upload_dir / user_id
+        stored_filename = self._stored_filename(user_id, attachment_id)
+        if stored_filename:
+            file_path = user_upload_dir / stored_filename
+            return file_path if file_path.is_file() else None
+        
+        for file_path in user_upload_dir.glob(f"{attachment_id}*"):
+            if file_path.is_file():
+                self._remember_filename(user_id, attachment_id, file_path.name)
+                return file_path
+        return None
+    
+    async def _presigned_url(self, s3_key: str, content_type: str, content_disposition: str) -> str:
+        """Generate a presigned GET URL that stays identical for the current signing window"""
+        cache_key = (s3_key, content_type, content_disposition, int(time.time() // PRESIGNED_URL_WINDOW))
+        url = self._url_cache.get(cache_key)
+        if url:
+            self._url_cache.move_to_end(cache_key)
+            return url
+        
+        # The public presign API handles endpoint resolution and addressing style
+        # (virtual-host, path-style, custom endpoints); the cache keeps it off the hot path
+        url = await self._s3(
+            'generate_presigned_url',
+            ClientMethod='get_object',
+            Params={
+                'Bucket': settings.S3_BUCKET, 
+                'Key': s3_key,
+                'ResponseContentType': content_type,  # Ensure proper MIME type
+                'ResponseContentDisposition': content_disposition  # Appropriate display method
+            },
+            ExpiresIn=PRESIGNED_URL_EXPIRES
+        )
+        
+        self._url_cache[cache_key] = url
+        if len(self._url_cache) > PRESIGNED_URL_CACHE_SIZE:
+            self._url_cache.popitem(last=False)
+        return url
     
     async def save_attachment(self, file: UploadFile, user_id: str) -> Dict[str, Any]:
         """Save an uploaded file and return attachment metadata"""
         try:
             # Generate unique filename
             file_id = str(uuid.uuid4())
+            uploaded_at = datetime.now(timezone.utc).isoformat()
             file_extension = Path(file.filename).suffix if file.filename else ''
             safe_filename = f"{file_id}{file_extension}"
             
             # Determine content type
-            content_type = file.content_type or mimetypes.guess_type(file.filename or '')[0] or 'application/octet-stream'
-            
-            # Read file content
-            content = await file.read()
-            file_size = len(content)
+            content_type = file.content_type or _guess_content_type(file.filename or '')
             
-            # Check file size limit (25MB default)
+            # Check file size limit (25MB default), trusting the size Starlette recorded first
             max_size = getattr(settings, 'max_attachment_size', 25 * 1024 * 1024)  # 25MB
+            too_large = HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_size // (1024*1024)}MB")
+            size_hint = getattr(file, 'size', None)
+            if size_hint and size_hint > max_size:
+                await file.close()
+                raise too_large
+            
+            # Otherwise determine size from the spooled file without reading it into memory
+            file.file.seek(0, os.SEEK_END)
+            file_size = file.file.tell()
+            file.file.seek(0)
             if file_size > max_size:
-                raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_size // (1024*1024)}MB")
+                await file.close()
+                raise too_large
             
             # Save to local storage or S3
-            if self.s3_client and hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET:
+            if hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET and self.s3_client:
                 # Save to S3
                 s3_key = f"attachments/{user_id}/{safe_filename}"
                 try:
-                    self.s3_client.put_object(
+                    await self._s3(
+                        'upload_fileobj',
+                        Fileobj=file.file,
                         Bucket=settings.S3_BUCKET,
                         Key=s3_key,
-                        Body=content,
-                        ContentType=content_type,
-                        Metadata={
-                            'original_filename': file.filename or '',
-                            'user_id': user_id,
-                            'uploaded_at': datetime.utcnow().isoformat()
-                        }
+                        ExtraArgs={
+                            'ContentType': content_type,
+                            'Metadata': {
+                                'original_filename': file.filename or '',
+                                'user_id': user_id,
+                                'uploaded_at': uploaded_at
+                            }
+                        },
+                        Config=S3_TRANSFER_CONFIG
                     )
-                    # Generate presigned URL for secure access (expires in 1 hour)
+                    # Generate presigned URL for secure access (stable within the signing window)
                     try:
-                        # Determine content disposition based on file type
-                        if content_type.startswith('image/'):
-                            # Images: inline display
-                            content_disposition = f'inline; filename="{file.filename or "attachment"}"'
-                        elif content_type.startswith('text/'):
-                            # Text files: inline display for preview
-                            content_disposition = f'inline; filename="{file.filename or "attachment"}"'
-                        elif content_type in ['application/pdf', 'application/json', 'application/xml']:
-                            # PDF and structured documents: inline for browser preview
-                            content_disposition = f'inline; filename="{file.filename or "attachment"}"'
-                        else:
-                            # Other files: attachment (download)
-                            content_disposition = f'attachment; filename="{file.filename or "attachment"}"'
-                        
-                        file_url = self.s3_client.generate_presigned_url(
-                            'get_object',
-                            Params={
-                                'Bucket': settings.S3_BUCKET, 
-                                'Key': s3_key,
-                                'ResponseContentType': content_type,  # Ensure proper MIME type
-                                'ResponseContentDisposition': content_disposition  # Appropriate display method
-                            },
-                            ExpiresIn=300  # 5 minutes
-                        )
+                        content_disposition = _disposition(content_type, file.filename or "attachment")
+                        file_url = await self._presigned_url(s3_key, content_type, content_disposition)
                     except Exception as e:
                         logger.error(f"Failed to generate presigned URL: {e}")
                         # Fallback to direct URL (but this may not work due to permissions)
@@ -104,22 +444,36 @@ class AttachmentHandler:
             else:
                 # Save to local storage
                 user_upload_dir = self.upload_dir / user_id
-                user_upload_dir.mkdir(parents=True, exist_ok=True)
+                if user_id not in self._known_dirs:
+                    user_upload_dir.mkdir(parents=True, exist_ok=True)
+                    self._known_dirs.add(user_id)
                 
                 file_path = user_upload_dir / safe_filename
-                async with aiofiles.open(file_path, 'wb') as f:
-                    await f.write(content)
+                
+                # Stream the upload to disk in 1MB chunks in a single executor hop
+                file.file.seek(0)
+                written = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, _save_local, file_path, file.file, max_size
+                )
+                if written > max_size:
+                    file_path.unlink(missing_ok=True)
+                    await file.close()
+                    raise too_large
                 
                 file_url = f"/attachments/{user_id}/{safe_filename}"
             
-            return {
+            attachment = {
                 "id": file_id,
                 "filename": file.filename or "unknown",
                 "content_type": content_type,
                 "size": file_size,
                 "url": file_url,
-                "uploaded_at": datetime.utcnow().isoformat()
+                "uploaded_at": uploaded_at
             }
+            if not await self._save_record(attachment, user_id, safe_filename):
+                # Without a metadata row, keep the filename index so lookups still avoid a listing
+                self._remember_filename(user_id, file_id, safe_filename)
+            return attachment
             
         except HTTPException:
             raise
@@ -128,31 +482,50 @@ class AttachmentHandler:
             raise HTTPException(status_code=500, detail="Failed to save attachment")
     
     async def save_multiple_attachments(self, files: List[UploadFile], user_id: str) -> List[Dict[str, Any]]:
-        """Save multiple uploaded files"""
-        attachments = []
-        for file in files:
-            attachment = await self.save_attachment(file, user_id)
-            attachments.append(attachment)
-        return attachments
+        """Save multiple uploaded files concurrently"""
+        # Bound in-flight uploads so many large files can't exhaust memory
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+        
+        async def save_one(file: UploadFile) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.save_attachment(file, user_id)
+        
+        return list(await asyncio.gather(*(save_one(file) for file in files)))
     
     async def get_attachment(self, attachment_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Get attachment metadata by ID"""
-        # This would typically query a database
-        # For now, we'll implement a simple file-based lookup
         try:
-            if self.s3_client and hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET:
-                # Look up in S3 - we need to list objects to find the one with the attachment_id
+            # Recorded attachments need no storage round trip at all
+            record = await self._get_record(attachment_id, user_id)
+            if record:
+                if hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET and self.s3_client:
+                    s3_key = f"attachments/{user_id}/{record['stored_filename']}"
+                    try:
+                        content_disposition = _disposition(record['content_type'], record['filename'])
+                        url = await self._presigned_url(s3_key, record['content_type'], content_disposition)
+                    except Exception as e:
+                        logger.error(f"Failed to generate presigned URL: {e}")
+                        url = f"https://{settings.S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{s3_key}" if settings.AWS_REGION != 'us-east-1' else f"https://{settings.S3_BUCKET}.s3.amazonaws.com/{s3_key}"
+                else:
+                    url = f"/attachments/{user_id}/{record['stored_filename']}"
+                return {
+                    "id": attachment_id,
+                    "filename": record['filename'],
+                    "content_type": record['content_type'],
+                    "size": record['size'],
+                    "url": url
+                }
+            
+            # Fall back to storage lookup for attachments uploaded before records existed
+            if hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET and self.s3_client:
+                # Look up in S3 - resolve the full key, then fetch its metadata
                 try:
-                    # List objects in the user's attachment folder to find the one with the attachment_id
-                    response = self.s3_client.list_objects_v2(
-                        Bucket=settings.S3_BUCKET,
-                        Prefix=f"attachments/{user_id}/{attachment_id}"
-                    )
+                    s3_key = await self._legacy_s3_key(attachment_id, user_id)
                     
-                    if 'Contents' in response and len(response['Contents']) > 0:
+                    if s3_key:
                         # Found the object, get its metadata
-                        s3_key = response['Contents'][0]['Key']
-                        head_response = self.s3_client.head_object(
+                        head_response = await self._s3(
+                            'head_object',
                             Bucket=settings.S3_BUCKET,
                             Key=s3_key
                         )
@@ -162,30 +535,8 @@ class AttachmentHandler:
                             content_type = head_response.get('ContentType', 'application/octet-stream')
                             original_filename = head_response.get('Metadata', {}).get('original_filename', 'attachment')
                             
-                            # Determine content disposition based on file type
-                            if content_type.startswith('image/'):
-                                # Images: inline display
-                                content_disposition = f'inline; filename="{original_filename}"'
-                            elif content_type.startswith('text/'):
-                                # Text files: inline display for preview
-                                content_disposition = f'inline; filename="{original_filename}"'
-                            elif content_type in ['application/pdf', 'application/json', 'application/xml']:
-                                # PDF and structured documents: inline for browser preview
-                                content_disposition = f'inline; filename="{original_filename}"'
-                            else:
-                                # Other files: attachment (download)
-                                content_disposition = f'attachment; filename="{original_filename}"'
-                            
-                            presigned_url = self.s3_client.generate_presigned_url(
-                                'get_object',
-                                Params={
-                                    'Bucket': settings.S3_BUCKET, 
-                                    'Key': s3_key,
-                                    'ResponseContentType': content_type,  # Ensure proper MIME type
-                                    'ResponseContentDisposition': content_disposition  # Appropriate display method
-                                },
-                                ExpiresIn=3600  # 1 hour
-                            )
+                            content_disposition = _disposition(content_type, original_filename)
+                            presigned_url = await self._presigned_url(s3_key, content_type, content_disposition)
                         except Exception as e:
                             logger.error(f"Failed to generate presigned URL: {e}")
                             # Fallback to direct URL
@@ -203,16 +554,15 @@ class AttachmentHandler:
                     return None
             else:
                 # Look up in local storage
-                user_upload_dir = self.upload_dir / user_id
-                for file_path in user_upload_dir.glob(f"{attachment_id}*"):
-                    if file_path.exists():
-                        return {
-                            "id": attachment_id,
-                            "filename": file_path.name,
-                            "content_type": mimetypes.guess_type(file_path.name)[0] or 'application/octet-stream',
-                            "size": file_path.stat().st_size,
-                            "url": f"/attachments/{user_id}/{file_path.name}"
-                        }
+                file_path = self._legacy_local_path(attachment_id, user_id)
+                if file_path:
+                    return {
+                        "id": attachment_id,
+                        "filename": file_path.name,
+                        "content_type": _guess_content_type(file_path.name),
+                        "size": file_path.stat().st_size,
+                        "url": f"/attachments/{user_id}/{file_path.name}"
+                    }
             return None
         except Exception as e:
             logger.error(f"Error getting attachment: {e}")
@@ -223,28 +573,25 @@ class AttachmentHandler:
         logger.info(f"🗑️ Attempting to delete attachment: {attachment_id} for user: {user_id}")
         
         try:
-            if self.s3_client and hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET:
+            if hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET and self.s3_client:
                 logger.info(f"📡 Searching for attachment in S3 bucket: {settings.S3_BUCKET}")
-                # Delete from S3 - we need to list objects to find the one with the attachment_id
+                # Delete from S3 - resolve the full key, then delete it
                 try:
-                    # List objects in the user's attachment folder to find the one with the attachment_id
                     prefix = f"attachments/{user_id}/{attachment_id}"
-                    logger.info(f"🔍 S3 search prefix: {prefix}")
+                    s3_key = await self._resolve_s3_key(attachment_id, user_id)
                     
-                    response = self.s3_client.list_objects_v2(
-                        Bucket=settings.S3_BUCKET,
-                        Prefix=prefix
-                    )
-                    
-                    if 'Contents' in response and len(response['Contents']) > 0:
+                    if s3_key:
                         # Found the object, delete it
-                        s3_key = response['Contents'][0]['Key']
                         logger.info(f"🎯 Found attachment in S3: {s3_key}")
                         
-                        self.s3_client.delete_object(
+                        await self._s3(
+                            'delete_object',
                             Bucket=settings.S3_BUCKET,
                             Key=s3_key
                         )
+                        self._forget_filename(user_id, attachment_id)
+                        self._list_cache.pop(prefix, None)
+                        await self._delete_record(attachment_id, user_id)
                         logger.info(f"✅ Successfully deleted from S3: {s3_key}")
                         return True
                     else:
@@ -262,18 +609,14 @@ class AttachmentHandler:
                     logger.warning(f"❌ User upload directory does not exist: {user_upload_dir}")
                     return False
                 
-                pattern = f"{attachment_id}*"
-                logger.info(f"🔍 Searching for files matching pattern: {pattern}")
-                
-                matching_files = list(user_upload_dir.glob(pattern))
-                logger.info(f"📋 Found {len(matching_files)} matching files: {[f.name for f in matching_files]}")
-                
-                for file_path in matching_files:
-                    if file_path.exists():
-                        logger.info(f"🗑️ Deleting file: {file_path}")
-                        file_path.unlink()
-                        logger.info(f"✅ Successfully deleted from local storage: {file_path}")
-                        return True
+                file_path = await self._resolve_local_path(attachment_id, user_id)
+                if file_path:
+                    logger.info(f"🗑️ Deleting file: {file_path}")
+                    file_path.unlink()
+                    self._forget_filename(user_id, attachment_id)
+                    await self._delete_record(attachment_id, user_id)
+                    logger.info(f"✅ Successfully deleted from local storage: {file_path}")
+                    return True
                 
                 logger.warning(f"❌ No matching attachment files found for: {attachment_id}")
             return False
@@ -281,40 +624,153 @@ class AttachmentHandler:
             logger.error(f"❌ Error deleting attachment {attachment_id}: {e}")
             return False
     
+    async def delete_attachments(self, attachment_ids: List[str], user_id: str) -> List[str]:
+        """Delete several attachments at once; returns the ids that were deleted"""
+        deleted = []
+        try:
+            if hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET and self.s3_client:
+                keys = await self._resolve_s3_keys(attachment_ids, user_id)
+                found = [(attachment_id, key) for attachment_id, key in zip(attachment_ids, keys) if key]
+                
+                # delete_objects accepts up to 1000 keys per request
+                for i in range(0, len(found), S3_DELETE_BATCH_SIZE):
+                    batch = found[i:i + S3_DELETE_BATCH_SIZE]
+                    response = await self._s3(
+                        'delete_objects',
+                        Bucket=settings.S3_BUCKET,
+                        Delete={'Objects': [{'Key': key} for _, key in batch], 'Quiet': True}
+                    )
+                    failed = {error['Key'] for error in response.get('Errors', [])}
+                    for attachment_id, key in batch:
+                        if key in failed:
+                            logger.error(f"❌ Failed to delete from S3: {key}")
+                            continue
+                        self._forget_filename(user_id, attachment_id)
+                        self._list_cache.pop(f"attachments/{user_id}/{attachment_id}", None)
+                        deleted.append(attachment_id)
+            else:
+                paths = await self._resolve_local_paths(attachment_ids, user_id)
+                for attachment_id, file_path in zip(attachment_ids, paths):
+                    if file_path:
+                        file_path.unlink(missing_ok=True)
+                        self._forget_filename(user_id, attachment_id)
+                        deleted.append(attachment_id)
+            
+            if deleted:
+                db = self._get_db()
+                if db:
+                    try:
+                        await self._db_call(db.table("attachments").delete().in_("id", deleted).eq("user_id", user_id))
+                    except Exception as e:
+                        logger.warning(f"Failed to delete attachment records: {e}")
+            
+            logger.info(f"✅ Deleted {len(deleted)} of {len(attachment_ids)} attachments for user: {user_id}")
+        except Exception as e:
+            logger.error(f"❌ Error deleting attachments: {e}")
+        return deleted
+    
     async def get_attachment_content(self, attachment_id: str, user_id: str) -> Optional[bytes]:
         """Get the actual file content of an attachment"""
         try:
-            if self.s3_client and hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET:
-                # Get from S3 - we need to list objects to find the one with the attachment_id
+            if hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET and self.s3_client:
+                # Get from S3 - resolve the full key, then fetch the object
                 try:
-                    # List objects in the user's attachment folder to find the one with the attachment_id
-                    response = self.s3_client.list_objects_v2(
-                        Bucket=settings.S3_BUCKET,
-                        Prefix=f"attachments/{user_id}/{attachment_id}"
-                    )
+                    s3_key = await self._resolve_s3_key(attachment_id, user_id)
                     
-                    if 'Contents' in response and len(response['Contents']) > 0:
+                    if s3_key:
                         # Found the object, get its content
-                        s3_key = response['Contents'][0]['Key']
-                        get_response = self.s3_client.get_object(
+                        get_response = await self._s3(
+                            'get_object',
                             Bucket=settings.S3_BUCKET,
                             Key=s3_key
                         )
-                        return get_response['Body'].read()
+                        return await asyncio.get_running_loop().run_in_executor(
+                            self._executor, get_response['Body'].read
+                        )
                     return None
                 except ClientError:
                     return None
             else:
                 # Get from local storage
-                user_upload_dir = self.upload_dir / user_id
-                for file_path in user_upload_dir.glob(f"{attachment_id}*"):
-                    if file_path.exists():
-                        async with aiofiles.open(file_path, 'rb') as f:
-                            return await f.read()
+                file_path = await self._resolve_local_path(attachment_id, user_id)
+                if file_path:
+                    return await asyncio.get_running_loop().run_in_executor(
+                        self._executor, file_path.read_bytes
+                    )
             return None
         except Exception as e:
             logger.error(f"Error getting attachment content: {e}")
             return None
+    
+    async def bulk_download(self, attachment_ids: List[str], user_id: str, dest_dir: str) -> List[str]:
+        """Download several attachments into dest_dir for export; returns the written paths"""
+        dest = Path(dest_dir)
+        dest.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        
+        if hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET and self.s3_client:
+            keys = await self._resolve_s3_keys(attachment_ids, user_id)
+            targets = [(key, str(dest / key.rsplit('/', 1)[-1])) for key in keys if key]
+            
+            # Threaded transfers on the handler's pool; boto3 releases the GIL on socket I/O
+            await asyncio.gather(*(
+                self._s3(
+                    'download_file',
+                    Bucket=settings.S3_BUCKET,
+                    Key=key,
+                    Filename=path,
+                    Config=S3_TRANSFER_CONFIG
+                )
+                for key, path in targets
+            ))
+            return [path for _, path in targets]
+        
+        paths = []
+        for file_path in await self._resolve_local_paths(attachment_ids, user_id):
+            if file_path:
+                target = dest / file_path.name
+                await loop.run_in_executor(self._executor, shutil.copyfile, file_path, target)
+                paths.append(str(target))
+        return paths
+    
+    async def get_attachment_stream(self, attachment_id: str, user_id: str) -> Optional[AsyncIterator[bytes]]:
+        """Open an attachment and return an async iterator over its content, or None if not found"""
+        try:
+            if hasattr(settings, 'S3_BUCKET') and settings.S3_BUCKET and self.s3_client:
+                try:
+                    s3_key = await self._resolve_s3_key(attachment_id, user_id)
+                    if not s3_key:
+                        return None
+                    get_response = await self._s3(
+                        'get_object',
+                        Bucket=settings.S3_BUCKET,
+                        Key=s3_key
+                    )
+                except ClientError:
+                    return None
+                body = get_response['Body']
+                return self._iter_chunks(body.read, body.close)
+            else:
+                file_path = await self._resolve_local_path(attachment_id, user_id)
+                if not file_path:
+                    return None
+                f = await asyncio.get_running_loop().run_in_executor(self._executor, open, file_path, 'rb')
+                return self._iter_chunks(f.read, f.close)
+        except Exception as e:
+            logger.error(f"Error opening attachment stream: {e}")
+            return None
+    
+    async def _iter_chunks(self, read: Callable[[int], bytes], close: Callable[[], None]) -> AsyncIterator[bytes]:
+        """Yield chunks from a blocking reader on the thread pool, closing it when done"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self._executor, read, STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            close()
 
 # Global instance
 attachment_handler = AttachmentHandler()
@@ -1,37 +1,316 @@
 """AWS SES Handler for email sending"""
 import asyncio
+import atexit
+import base64
+import functools
+import hashlib
+import random
 import smtplib
 import ssl
+import time
+import weakref
+from collections import OrderedDict
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+from email.message import Message
+from email.header import Header
+from email.utils import formataddr, parseaddr
 from typing import List, Optional, Dict, Any
 import logging
 
-import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+
+try:
+    # SIMD base64 codec; same API as the stdlib module
+    import pybase64 as b64codec
+except ImportError:
+    b64codec = base64
 
 from shared.config import settings
 
 logger = logging.getLogger(__name__)
 
+# One TLS context for every SES SMTP connection (loading the CA bundle once)
+_SSL_CONTEXT = ssl.create_default_context()
+
+# Authenticated SES SMTP sessions allowed open at once
+SMTP_POOL_SIZE = 4
+
+# Recycle a pooled SMTP session after this many messages
+SMTP_MAX_MESSAGES_PER_CONNECTION = 100
+
+# Bytes per socket write when streaming the DATA payload
+SMTP_DATA_CHUNK_SIZE = 64 * 1024
+
+# Seconds between MaxSendRate refreshes, so quota increases take effect without a restart
+SEND_RATE_REFRESH_INTERVAL = 3600
+
+# Seconds before retrying a failed MaxSendRate lookup; sends are not throttled meanwhile
+SEND_RATE_RETRY_INTERVAL = 60
+
+# Bounds for the rendered-message cache (entries and total bytes); renderings larger than
+# the per-entry cap (typically ones with attachments) are used once and not kept
+RENDERED_CACHE_MAX_ENTRIES = 64
+RENDERED_CACHE_MAX_BYTES = 8 * 1024 * 1024
+RENDERED_CACHE_MAX_ENTRY_BYTES = 256 * 1024
+
+# Stands in for the To header in cached renderings
+_TO_PLACEHOLDER = 'x-rendered-to-placeholder'
+
+# Seconds to reuse quota / identity verification results in health checks
+SES_DESCRIBE_CACHE_TTL = 60
+
+# Maximum destinations per SendBulkTemplatedEmail call
+SES_BULK_BATCH_SIZE = 50
+
+# Retries for SES API calls rejected with Throttling
+SES_THROTTLE_RETRIES = 3
+
+# Sends in flight at once for send_batch (each holds a worker thread while waiting on SES)
+SEND_BATCH_CONCURRENCY = 16
+
+# Longest line an unencoded (7bit/8bit) MIME part may carry (RFC 5322)
+MAX_UNENCODED_LINE = 998
+
+
+@functools.lru_cache(maxsize=256)
+def _split_content_type(content_type: str) -> tuple:
+    """Split a MIME type into (maintype, subtype), defaulting to application/octet-stream"""
+    i = content_type.find('/')
+    return (content_type[:i], content_type[i + 1:]) if i > 0 else ('application', 'octet-stream')
+
+
+@functools.lru_cache(maxsize=1024)
+def _sender_domain_ok(from_email: str, verified_domain: Optional[str]) -> bool:
+    """Whether from_email's domain is the verified SES domain (memoized for repeat senders)"""
+    _, sep, domain = from_email.rpartition('@')
+    return bool(sep) and domain.lower() == verified_domain
+
+
+def _addr_header(addresses: List[str]) -> str:
+    """Join addresses for a To/Cc header, skipping the join for a single recipient"""
+    return addresses[0] if len(addresses) == 1 else ', '.join(addresses)
+
+
+def _header_address(address: str) -> str:
+    """Address as it may appear in a header: RFC 2047-encoded display name, IDNA domain"""
+    if address.isascii():
+        return address
+    name, addr = parseaddr(address)
+    local, sep, domain = addr.rpartition('@')
+    if sep and not domain.isascii():
+        try:
+            addr = f"{local}@{domain.encode('idna').decode('ascii')}"
+        except UnicodeError:
+            pass
+    if not name:
+        return addr
+    if addr.isascii():
+        return formataddr((name, addr), charset='utf-8')
+    # A non-ASCII local part stays UTF-8; the SMTP path sends it with SMTPUTF8
+    return f"{Header(name, 'utf-8').encode()} <{addr}>"
+
+
+def _address_rendering(template: bytes, to_emails: List[str]) -> bytes:
+    """Fill the To header of a cached rendering"""
+    header_addresses = [_header_address(address) for address in to_emails]
+    to_header = _addr_header(header_addresses)
+    if len(to_header) > 900:
+        # Fold long recipient lists to stay under the SMTP line length limit
+        to_header = ',\r\n '.join(header_addresses)
+    return template.replace(_TO_PLACEHOLDER.encode('ascii'), to_header.encode('utf-8'), 1)
+
+
+def _unencoded_text(content: bytes) -> Optional[str]:
+    """Payload for sending a text attachment without base64, or None if it must be encoded"""
+    if b'\0' in content:
+        return None
+    try:
+        content.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    if any(len(line) > MAX_UNENCODED_LINE for line in content.splitlines()):
+        return None
+    # Surrogate-escaped so BytesGenerator writes the UTF-8 bytes through unchanged
+    return content.decode('ascii', 'surrogateescape')
+
+
+def _build_attachment_part(filename: str, content: bytes, content_type: str) -> Message:
+    """Build an attachment part with its headers set directly, skipping MIMEBase/encoder passes"""
+    main_type, sub_type = _split_content_type(content_type)
+    part = Message()
+    
+    # UTF-8 text (CSV, JSON, ...) goes out as-is instead of growing a third under base64
+    text = _unencoded_text(content) if main_type == 'text' else None
+    if text is not None:
+        part['Content-Type'] = f'{main_type}/{sub_type}; charset="utf-8"'
+        part['Content-Transfer-Encoding'] = '7bit' if content.isascii() else '8bit'
+        part['Content-Disposition'] = f'attachment; filename="{filename}"'
+        part.set_payload(text)
+        return part
+    
+    part['Content-Type'] = f"{main_type}/{sub_type}"
+    part['Content-Transfer-Encoding'] = 'base64'
+    part['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Encode once (76-char lines) rather than set_payload + encode_base64's second copy
+    part.set_payload(b64codec.encodebytes(content).decode('ascii'))
+    return part
+
+
+class PipelinedSMTP(smtplib.SMTP_SSL):
+    """SMTP_SSL that sends MAIL FROM, RCPT TO and DATA as one batch when the server offers PIPELINING (RFC 2920)"""
+    
+    # Last TLS session, offered on reconnect so the server can skip the full handshake
+    _tls_session = None
+    
+    def _get_socket(self, host, port, timeout):
+        # An expired session is simply ignored by the server and a full handshake happens
+        new_socket = smtplib.SMTP._get_socket(self, host, port, timeout)
+        return self.context.wrap_socket(
+            new_socket, server_hostname=self._host, session=PipelinedSMTP._tls_session
+        )
+    
+    def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()):
+        self.ehlo_or_helo_if_needed()
+        if isinstance(msg, bytes) and not msg.isascii() and self.has_extn('8bitmime'):
+            # 8bit text attachments need the 8BITMIME body type
+            mail_options = (*mail_options, 'BODY=8BITMIME')
+        recipients = [to_addrs] if isinstance(to_addrs, str) else to_addrs
+        smtputf8 = not (from_addr.isascii() and all(each.isascii() for each in recipients))
+        if smtputf8:
+            # Non-ASCII mailboxes (and their UTF-8 To header) need SMTPUTF8 (RFC 6531)
+            if not self.has_extn('smtputf8'):
+                raise smtplib.SMTPNotSupportedError(
+                    "One or more source or delivery addresses require internationalized email support, "
+                    "but the server does not advertise the required SMTPUTF8 capability")
+            mail_options = (*mail_options, 'SMTPUTF8')
+        if not self.has_extn('pipelining'):
+            return super().sendmail(from_addr, to_addrs, msg, mail_options, rcpt_options)
+        
+        if isinstance(msg, str):
+            msg = smtplib._fix_eols(msg).encode('ascii')
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        
+        esmtp_opts = list(mail_options)
+        if self.has_extn('size'):
+            esmtp_opts.insert(0, "size=%d" % len(msg))
+        mail_opts = (' ' + ' '.join(esmtp_opts)) if esmtp_opts else ''
+        rcpt_opts = (' ' + ' '.join(rcpt_options)) if rcpt_options else ''
+        
+        # One write for the whole envelope, then read the replies in order
+        commands = ["mail FROM:%s%s" % (smtplib.quoteaddr(from_addr), mail_opts)]
+        commands.extend("rcpt TO:%s%s" % (smtplib.quoteaddr(each), rcpt_opts) for each in to_addrs)
+        commands.append("data")
+        envelope = ''.join(f"{command}{smtplib.CRLF}" for command in commands)
+        self.send(envelope.encode('utf-8') if smtputf8 else envelope)
+        
+        mail_code, mail_resp = self.getreply()
+        senderrs = {}
+        for each in to_addrs:
+            code, resp = self.getreply()
+            if code not in (250, 251):
+                senderrs[each] = (code, resp)
+        data_code, data_resp = self.getreply()
+        
+        if mail_code != 250:
+            self._abort_pipelined(mail_code, data_code)
+            raise smtplib.SMTPSenderRefused(mail_code, mail_resp, from_addr)
+        if len(senderrs) == len(to_addrs):
+            self._abort_pipelined(mail_code, data_code)
+            raise smtplib.SMTPRecipientsRefused(senderrs)
+        if data_code != 354:
+            self._abort_pipelined(mail_code, data_code)
+            raise smtplib.SMTPDataError(data_code, data_resp)
+        
+        self._send_data(msg)
+        code, resp = self.getreply()
+        if code != 250:
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise smtplib.SMTPDataError(code, resp)
+        return senderrs
+    
+    def _send_data(self, msg: bytes):
+        """Write the DATA payload in chunks, without copying it to append the terminator"""
+        if msg.startswith(b'.') or b'\n.' in msg:
+            msg = smtplib._quote_periods(msg)
+        view = memoryview(msg)
+        for start in range(0, len(view), SMTP_DATA_CHUNK_SIZE):
+            self.send(view[start:start + SMTP_DATA_CHUNK_SIZE])
+        self.send(b"." + smtplib.bCRLF if msg.endswith(smtplib.bCRLF) else smtplib.bCRLF + b"." + smtplib.bCRLF)
+    
+    def _abort_pipelined(self, mail_code: int, data_code: int):
+        """Reset (or drop, on 421) the session after a failed pipelined envelope"""
+        if 421 in (mail_code, data_code):
+            self.close()
+        elif data_code == 354:
+            # DATA was accepted despite the failure; end it with an empty message first
+            self.send(b"." + smtplib.bCRLF)
+            self.getreply()
+            self._rset()
+        else:
+            self._rset()
+
 
 class AWSSESHandler:
     """AWS SES handler with both API and SMTP interface support"""
     
+    # Process-wide pool of idle SMTP sessions as [server, messages sent], shared by all handler instances
+    _smtp_idle: List[list] = []
+    
+    # Per event loop (SMTP slot semaphore, send-rate lock), created on first use there;
+    # asyncio primitives must not outlive the loop they were used on (asyncio.run per script call)
+    _loop_primitives: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+    
+    # Rendered messages (with a To placeholder) keyed by content, for repeat sends to new recipients
+    _rendered_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+    _rendered_cache_bytes = 0
+    
+    # Process-wide token bucket keeping sends under the account's MaxSendRate
+    _send_rate: Optional[float] = None
+    _send_tokens = 0.0
+    _send_tokens_updated = 0.0
+    _send_rate_refresh_at = 0.0
+    
+    # SES template names known to exist, so ensure_template calls the API once per name
+    _known_templates: set = set()
+    
+    @classmethod
+    def _primitives(cls) -> tuple:
+        """(SMTP slot semaphore, send-rate lock) for the running event loop"""
+        loop = asyncio.get_running_loop()
+        primitives = cls._loop_primitives.get(loop)
+        if primitives is None:
+            primitives = cls._loop_primitives[loop] = (asyncio.Semaphore(SMTP_POOL_SIZE), asyncio.Lock())
+        return primitives
+    
     def __init__(self):
         self.settings = settings
-        self.ses_client = None
         self.use_api = True  # Default to API, fallback to SMTP if needed
+        self._verified_domain = (self.settings.AWS_SES_VERIFIED_DOMAIN or '').lower() or None
         
-        # Initialize SES client
-        try:
-            self.ses_client = self.settings.get_ses_client()
-            logger.info("AWS SES client initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize AWS SES client: {e}")
-            self.ses_client = None
+        # Short-lived cache for SES describe calls (quota, identity status)
+        self._cache: Dict[str, tuple] = {}
+        
+        # SES client is built on first use so SMTP-only paths never load boto3
+        self._ses_client = None
+        self._ses_client_checked = False
+    
+    @property
+    def ses_client(self):
+        """SES client, initialized on first access"""
+        if not self._ses_client_checked:
+            self._ses_client_checked = True
+            try:
+                self._ses_client = self.settings.get_ses_client()
+                logger.info("AWS SES client initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize AWS SES client: {e}")
+                self._ses_client = None
+        return self._ses_client
     
     async def send_email(
         self,
@@ -51,8 +330,28 @@ class AWSSESHandler:
             logger.error(f"Sender domain not verified: {from_email}")
             return False
         
-        # Check if we have attachments - use SMTP for complex emails
+        # Wait for a send slot so bursts stay under the SES rate limit
+        await self._acquire_send_token()
+        
+        # Check if we have attachments - send the MIME message over the raw API, SMTP as fallback
         if attachments and len(attachments) > 0:
+            if self.use_api and self.ses_client:
+                logger.info(f"Email has {len(attachments)} attachments, using SES raw API")
+                try:
+                    raw_message = self._render_message(
+                        from_email, to_emails, subject, body, html_body, cc_emails, attachments
+                    )
+                except Exception as e:
+                    logger.error(f"❌ Failed to build email with attachments: {e}")
+                    return False
+                
+                try:
+                    all_recipients = [*to_emails, *(cc_emails or ()), *(bcc_emails or ())]
+                    return await self._send_raw_via_api(raw_message, from_email, all_recipients)
+                except (ClientError, BotoCoreError) as e:
+                    # Rejections and transport/credential errors both fall back to SMTP
+                    logger.warning(f"Raw API sending failed, falling back to SMTP: {e}")
+            
             logger.info(f"Email has {len(attachments)} attachments, using SMTP interface")
             return await self._send_via_smtp(
                 from_email, to_emails, subject, body, html_body, 
@@ -75,6 +374,192 @@ class AWSSESHandler:
             cc_emails, bcc_emails, attachments
         )
     
+    async def send_bulk(
+        self,
+        template_name: str,
+        from_email: str,
+        destinations: List[Dict[str, Any]],
+        default_template_data: str = '{}'
+    ) -> List[Dict[str, Any]]:
+        """Send a stored SES template to many destinations, 50 per SendBulkTemplatedEmail call"""
+        if not self._validate_sender_domain(from_email):
+            logger.error(f"Sender domain not verified: {from_email}")
+            return []
+        if not self.ses_client:
+            logger.error("AWS SES client not initialized, cannot send bulk email")
+            return []
+        
+        statuses = []
+        for i in range(0, len(destinations), SES_BULK_BATCH_SIZE):
+            batch = destinations[i:i + SES_BULK_BATCH_SIZE]
+            # Each destination counts against the send rate
+            for _ in batch:
+                await self._acquire_send_token()
+            try:
+                response = await self._call_ses(
+                    'send_bulk_templated_email',
+                    Source=from_email,
+                    Template=template_name,
+                    DefaultTemplateData=default_template_data,
+                    Destinations=batch
+                )
+                statuses.extend(response.get('Status', []))
+            except ClientError as e:
+                logger.error(f"AWS SES bulk send error [{e.response['Error']['Code']}]: {e.response['Error']['Message']}")
+                statuses.extend({'Status': 'Failed', 'Error': str(e)} for _ in batch)
+        
+        sent = sum(1 for status in statuses if status.get('Status') == 'Success')
+        logger.info(f"📊 Bulk email sent to {sent}/{len(destinations)} destinations via AWS SES API")
+        return statuses
+    
+    async def send_many(
+        self,
+        from_email: str,
+        recipients: List[str],
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None,
+        attachments: List[dict] = None
+    ) -> Dict[str, bool]:
+        """Send one copy of the same message to each recipient, rendering and encoding it only once"""
+        if not self._validate_sender_domain(from_email):
+            logger.error(f"Sender domain not verified: {from_email}")
+            return {recipient: False for recipient in recipients}
+        
+        template = self._render_template(from_email, subject, body, html_body, None, attachments)
+        
+        async def send_one(recipient: str) -> bool:
+            await self._acquire_send_token()
+            raw_message = _address_rendering(template, [recipient])
+            if self.use_api and self.ses_client:
+                try:
+                    return await self._send_raw_via_api(raw_message, from_email, [recipient])
+                except (ClientError, BotoCoreError) as e:
+                    logger.warning(f"Raw API sending failed, falling back to SMTP: {e}")
+            return await self._deliver_via_smtp(raw_message, from_email, [recipient])
+        
+        results = await asyncio.gather(*(send_one(recipient) for recipient in recipients))
+        logger.info(f"📊 Sent {sum(results)}/{len(recipients)} individual copies via AWS SES")
+        return dict(zip(recipients, results))
+    
+    async def send_batch(self, jobs: List[Dict[str, Any]]) -> List[bool]:
+        """Send independent emails concurrently; each job holds send_email's keyword arguments"""
+        # The token bucket keeps the overall rate under MaxSendRate; this bounds in-flight sends
+        slots = asyncio.Semaphore(SEND_BATCH_CONCURRENCY)
+        
+        async def send_one(job: Dict[str, Any]) -> bool:
+            async with slots:
+                try:
+                    return await self.send_email(**job)
+                except Exception as e:
+                    logger.error(f"❌ Batch send to {job.get('to_emails')} failed: {e}")
+                    return False
+        
+        results = await asyncio.gather(*(send_one(job) for job in jobs))
+        logger.info(f"📊 Sent {sum(results)}/{len(jobs)} batched emails via AWS SES")
+        return results
+    
+    async def ensure_template(
+        self,
+        template_name: str,
+        subject: str,
+        text_body: str,
+        html_body: Optional[str] = None
+    ) -> bool:
+        """Create the SES template for send_bulk once per process (an existing template is left as is)"""
+        if template_name in AWSSESHandler._known_templates:
+            return True
+        if not self.ses_client:
+            logger.error("AWS SES client not initialized, cannot create template")
+            return False
+        
+        template = {'TemplateName': template_name, 'SubjectPart': subject, 'TextPart': text_body}
+        if html_body:
+            template['HtmlPart'] = html_body
+        try:
+            await self._call_ses('create_template', Template=template)
+            logger.info(f"✅ Created AWS SES template {template_name}")
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'AlreadyExists':
+                logger.error(f"AWS SES template error [{e.response['Error']['Code']}]: {e.response['Error']['Message']}")
+                return False
+        
+        AWSSESHandler._known_templates.add(template_name)
+        return True
+    
+    async def _cached(self, key: str, ttl: float, fetch):
+        """Return fetch()'s result memoized for ttl seconds; failures are not cached"""
+        entry = self._cache.get(key)
+        now = time.monotonic()
+        if entry and entry[1] > now:
+            return entry[0]
+        try:
+            value = await fetch()
+        except ClientError:
+            self._cache.pop(key, None)
+            raise
+        self._cache[key] = (value, now + ttl)
+        return value
+    
+    async def _acquire_send_token(self):
+        """Take one token from the shared bucket, waiting for a refill if it is empty"""
+        cls = AWSSESHandler
+        send_rate_lock = cls._primitives()[1]
+        async with send_rate_lock:
+            if time.monotonic() >= cls._send_rate_refresh_at:
+                rate = await self._get_max_send_rate()
+                now = time.monotonic()
+                if rate is None:
+                    # Keep the last known rate (if any) and try again soon
+                    cls._send_rate_refresh_at = now + SEND_RATE_RETRY_INTERVAL
+                else:
+                    if cls._send_rate is None:
+                        cls._send_tokens = rate
+                        cls._send_tokens_updated = now
+                    cls._send_rate = rate
+                    cls._send_rate_refresh_at = now + SEND_RATE_REFRESH_INTERVAL
+            
+            # Rate unknown (no API client, or the quota lookup failed): don't throttle
+            if cls._send_rate is None:
+                return
+            
+            while True:
+                now = time.monotonic()
+                cls._send_tokens = min(
+                    max(cls._send_rate, 1.0),
+                    cls._send_tokens + (now - cls._send_tokens_updated) * cls._send_rate
+                )
+                cls._send_tokens_updated = now
+                if cls._send_tokens >= 1:
+                    cls._send_tokens -= 1
+                    return
+                await asyncio.sleep((1 - cls._send_tokens) / cls._send_rate)
+    
+    async def _get_max_send_rate(self) -> Optional[float]:
+        """Look up the account's MaxSendRate (None when there is no API client or the lookup fails)"""
+        if self.ses_client:
+            try:
+                quota = await asyncio.to_thread(self.ses_client.get_send_quota)
+                rate = float(quota.get('MaxSendRate', 0))
+                if rate > 0:
+                    logger.info(f"📊 AWS SES max send rate: {rate}/s")
+                    return rate
+            except Exception as e:
+                logger.warning(f"Could not read AWS SES send quota: {e}")
+        return None
+    
+    async def _call_ses(self, method: str, **kwargs):
+        """Call an SES API method off the event loop, backing off and retrying on Throttling"""
+        for attempt in range(SES_THROTTLE_RETRIES + 1):
+            try:
+                return await asyncio.to_thread(getattr(self.ses_client, method), **kwargs)
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'Throttling' or attempt == SES_THROTTLE_RETRIES:
+                    raise
+                delay = 2 ** attempt + random.random()
+                logger.warning(f"AWS SES throttled, retrying {method} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+    
     async def _send_via_api(
         self,
         from_email: str,
@@ -101,8 +586,9 @@ class AWSSESHandler:
             if html_body:
                 message_body['Html'] = {'Data': html_body, 'Charset': 'UTF-8'}
             
-            # Send email
-            response = self.ses_client.send_email(
+            # Send email off the event loop
+            response = await self._call_ses(
+                'send_email',
                 Source=from_email,
                 Destination=destination,
                 Message={
@@ -115,7 +601,7 @@ class AWSSESHandler:
             logger.info(f"✅ Email sent successfully via AWS SES API. MessageId: {message_id}")
             
             # Log metrics
-            all_recipients = to_emails + (cc_emails or []) + (bcc_emails or [])
+            all_recipients = [*to_emails, *(cc_emails or ()), *(bcc_emails or ())]
             logger.info(f"📊 Email sent to {len(all_recipients)} recipients via AWS SES API")
             
             return True
@@ -135,6 +621,133 @@ class AWSSESHandler:
             logger.error(f"Unexpected error in AWS SES API: {e}")
             return False
     
+    def _build_mime_message(
+        self,
+        from_email: str,
+        to_emails: List[str],
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None,
+        cc_emails: List[str] = None,
+        attachments: List[dict] = None
+    ) -> MIMEMultipart:
+        """Build the MIME message for a send"""
+        # Create message with proper MIME structure
+        if attachments and len(attachments) > 0:
+            msg = MIMEMultipart('mixed')
+        elif html_body:
+            msg = MIMEMultipart('alternative')
+        else:
+            # Plain text only: a single-part message, no multipart wrapper or boundaries
+            msg = MIMEText(body, 'plain')
+        
+        msg['From'] = from_email
+        msg['To'] = _addr_header(to_emails)
+        msg['Subject'] = subject
+        
+        if cc_emails:
+            msg['Cc'] = _addr_header(cc_emails)
+        
+        if not msg.is_multipart():
+            return msg
+        
+        # Create body container for text/html content (the message itself when there are no attachments)
+        if html_body:
+            body_container = MIMEMultipart('alternative') if attachments else msg
+            body_container.attach(MIMEText(body, 'plain'))
+            body_container.attach(MIMEText(html_body, 'html'))
+            if body_container is not msg:
+                msg.attach(body_container)
+        else:
+            msg.attach(MIMEText(body, 'plain'))
+        
+        # Add attachments
+        if attachments:
+            if logger.isEnabledFor(logging.INFO):
+                total_kb = sum(len(att.get('content', b'')) for att in attachments) >> 10
+                logger.info("📎 Adding %d attachments (%dKB total)", len(attachments), total_kb)
+            
+            for attachment in attachments:
+                try:
+                    msg.attach(_build_attachment_part(
+                        attachment['filename'],
+                        attachment['content'],
+                        attachment.get('content_type', 'application/octet-stream')
+                    ))
+                
+                except Exception as e:
+                    logger.error(f"❌ Error attaching {attachment.get('filename', 'unknown')}: {e}")
+                    continue
+        
+        return msg
+    
+    def _render_message(
+        self,
+        from_email: str,
+        to_emails: List[str],
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None,
+        cc_emails: List[str] = None,
+        attachments: List[dict] = None
+    ) -> bytes:
+        """Render the message to CRLF bytes, reusing the cached rendering when only the To list differs"""
+        template = self._render_template(from_email, subject, body, html_body, cc_emails, attachments)
+        return _address_rendering(template, to_emails)
+    
+    def _render_template(
+        self,
+        from_email: str,
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None,
+        cc_emails: List[str] = None,
+        attachments: List[dict] = None
+    ) -> bytes:
+        """Rendered CRLF bytes with a placeholder To header, cached per message content"""
+        attachments_key = tuple(
+            (att.get('filename'), att.get('content_type'), hashlib.sha1(att.get('content', b'')).digest())
+            for att in (attachments or [])
+        )
+        cache_key = (from_email, subject, body, html_body, tuple(cc_emails or ()), attachments_key)
+        
+        cache = AWSSESHandler._rendered_cache
+        template = cache.get(cache_key)
+        if template is None:
+            msg = self._build_mime_message(
+                from_email, [_TO_PLACEHOLDER], subject, body, html_body, cc_emails, attachments
+            )
+            template = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+            
+            if len(template) > RENDERED_CACHE_MAX_ENTRY_BYTES:
+                return template
+            
+            cache[cache_key] = template
+            AWSSESHandler._rendered_cache_bytes += len(template)
+            while cache and (
+                len(cache) > RENDERED_CACHE_MAX_ENTRIES
+                or AWSSESHandler._rendered_cache_bytes > RENDERED_CACHE_MAX_BYTES
+            ):
+                _, evicted = cache.popitem(last=False)
+                AWSSESHandler._rendered_cache_bytes -= len(evicted)
+        else:
+            cache.move_to_end(cache_key)
+        return template
+    
+    async def _send_raw_via_api(self, raw_message: bytes, from_email: str, all_recipients: List[str]) -> bool:
+        """Send a rendered MIME message via the AWS SES SendRawEmail API (raises ClientError on failure)"""
+        response = await self._call_ses(
+            'send_raw_email',
+            Source=from_email,
+            Destinations=all_recipients,
+            RawMessage={'Data': raw_message}
+        )
+        
+        message_id = response.get('MessageId')
+        logger.info(f"✅ Email sent successfully via AWS SES raw API. MessageId: {message_id}")
+        logger.info(f"📊 Email sent to {len(all_recipients)} recipients via AWS SES raw API")
+        return True
+    
     async def _send_via_smtp(
         self,
         from_email: str,
@@ -147,6 +760,19 @@ class AWSSESHandler:
         attachments: List[dict] = None
     ) -> bool:
         """Send email via AWS SES SMTP interface"""
+        try:
+            email_content = self._render_message(
+                from_email, to_emails, subject, body, html_body, cc_emails, attachments
+            )
+        except Exception as e:
+            logger.error(f"Unexpected error in AWS SES SMTP: {e}")
+            return False
+        
+        all_recipients = [*to_emails, *(cc_emails or ()), *(bcc_emails or ())]
+        return await self._deliver_via_smtp(email_content, from_email, all_recipients)
+    
+    async def _deliver_via_smtp(self, email_content: bytes, from_email: str, all_recipients: List[str]) -> bool:
+        """Send a rendered MIME message over a pooled AWS SES SMTP session"""
         try:
             smtp_config = self.settings.get_smtp_config()
             
@@ -155,77 +781,28 @@ class AWSSESHandler:
                 logger.error("AWS SES SMTP credentials not configured")
                 return False
             
-            # Create message with proper MIME structure
-            if attachments and len(attachments) > 0:
-                msg = MIMEMultipart('mixed')
-            else:
-                msg = MIMEMultipart('alternative')
-            
-            msg['From'] = from_email
-            msg['To'] = ', '.join(to_emails)
-            msg['Subject'] = subject
-            
-            if cc_emails:
-                msg['Cc'] = ', '.join(cc_emails)
-            
-            # Create body container for text/html content
-            if html_body:
-                body_container = MIMEMultipart('alternative')
-                body_container.attach(MIMEText(body, 'plain'))
-                body_container.attach(MIMEText(html_body, 'html'))
-                msg.attach(body_container)
-            else:
-                msg.attach(MIMEText(body, 'plain'))
+            logger.info("📧 Sending email to %d recipients via AWS SES SMTP (%d bytes)", len(all_recipients), len(email_content))
             
-            # Add attachments
-            if attachments:
-                total_attachment_size = sum(len(att.get('content', b'')) for att in attachments)
-                logger.info(f"📎 Adding {len(attachments)} attachments ({total_attachment_size // 1024}KB total)")
+            # A session carries one transaction at a time; the semaphore bounds how many are open
+            smtp_slots = AWSSESHandler._primitives()[0]
+            async with smtp_slots:
+                # Check out a pooled AWS SES SMTP session, connecting if none is idle
+                try:
+                    entry = await self._get_smtp_connection(smtp_config)
+                except Exception as e:
+                    logger.error(f"❌ Failed to establish SMTP connection: {e}")
+                    return False
                 
-                for attachment in attachments:
-                    try:
-                        content_type = attachment.get('content_type', 'application/octet-stream')
-                        main_type, sub_type = content_type.split('/', 1) if '/' in content_type else ('application', 'octet-stream')
-                        
-                        part = MIMEBase(main_type, sub_type)
-                        part.set_payload(attachment['content'])
-                        encoders.encode_base64(part)
-                        
-                        part.add_header(
-                            'Content-Disposition',
-                            f'attachment; filename="{attachment["filename"]}"'
-                        )
-                        
-                        msg.attach(part)
-                        
-                    except Exception as e:
-                        logger.error(f"❌ Error attaching {attachment.get('filename', 'unknown')}: {e}")
-                        continue
-            
-            # Connect to AWS SES SMTP server with multi-port support
-            try:
-                server = await self._create_smtp_connection(smtp_config)
-            except Exception as e:
-                logger.error(f"❌ Failed to establish SMTP connection: {e}")
-                return False
-            
-            # Send email
-            all_recipients = to_emails + (cc_emails or []) + (bcc_emails or [])
-            email_content = msg.as_string()
-            
-            logger.info(f"📧 Sending email to {len(all_recipients)} recipients via AWS SES SMTP ({len(email_content)} bytes)")
-            
-            # Send email with timeout protection
-            try:
-                result = server.sendmail(from_email, all_recipients, email_content)
-                server.quit()
-            except Exception as e:
-                logger.error(f"❌ Failed to send email via SMTP: {e}")
                 try:
-                    server.quit()
-                except:
-                    pass
-                return False
+                    result = await asyncio.to_thread(entry[0].sendmail, from_email, all_recipients, email_content)
+                except Exception as e:
+                    logger.error(f"❌ Failed to send email via SMTP: {e}")
+                    await asyncio.to_thread(AWSSESHandler._quit_smtp, entry[0])
+                    return False
+                
+                # Hand the session back for the next send
+                entry[1] += 1
+                AWSSESHandler._smtp_idle.append(entry)
             
             # Check result
             if isinstance(result, dict) and len(result) == 0:
@@ -249,11 +826,7 @@ class AWSSESHandler:
     
     def _validate_sender_domain(self, from_email: str) -> bool:
         """Validate that sender domain is verified in SES"""
-        try:
-            domain = from_email.split('@')[1]
-            return domain == self.settings.AWS_SES_VERIFIED_DOMAIN
-        except Exception:
-            return False
+        return _sender_domain_ok(from_email, self._verified_domain)
     
     async def test_connection(self) -> Dict[str, Any]:
         """Test AWS SES connection and configuration"""
@@ -265,58 +838,144 @@ class AWSSESHandler:
             'errors': []
         }
         
+        async def probe_quota():
+            return await self._cached(
+                'send_quota', SES_DESCRIBE_CACHE_TTL,
+                lambda: asyncio.to_thread(self.ses_client.get_send_quota)
+            )
+        
+        async def probe_domain():
+            return await self._cached(
+                'identity_verification', SES_DESCRIBE_CACHE_TTL,
+                lambda: asyncio.to_thread(
+                    self.ses_client.get_identity_verification_attributes,
+                    Identities=[self.settings.AWS_SES_VERIFIED_DOMAIN]
+                )
+            )
+        
+        async def probe_smtp():
+            smtp_config = self.settings.get_smtp_config()
+            if not (smtp_config['username'] and smtp_config['password']):
+                return None
+            logger.debug("Testing SMTP connection")
+            return await asyncio.to_thread(self._smtp_login_probe, smtp_config)
+        
+        # Run the API and SMTP probes concurrently; wall time is the slowest probe
+        api_enabled = self.ses_client is not None
+        quota_response, domain_response, smtp_result = await asyncio.gather(
+            probe_quota() if api_enabled else asyncio.sleep(0),
+            probe_domain() if api_enabled else asyncio.sleep(0),
+            probe_smtp(),
+            return_exceptions=True
+        )
+        
         # Test API connection
-        if self.ses_client:
-            try:
-                quota_response = self.ses_client.get_send_quota()
+        if api_enabled:
+            if isinstance(quota_response, Exception):
+                results['errors'].append(f"API test failed: {quota_response}")
+            else:
                 results['api_test'] = True
+                if quota_response.get('MaxSendRate'):
+                    AWSSESHandler._send_rate = float(quota_response['MaxSendRate'])
                 results['quota_info'] = {
                     'daily_quota': quota_response.get('Max24HourSend', 0),
                     'daily_sent': quota_response.get('SentLast24Hours', 0),
                     'send_rate': quota_response.get('MaxSendRate', 0)
                 }
-                
-                # Check domain verification
-                domain_response = self.ses_client.get_identity_verification_attributes(
-                    Identities=[self.settings.AWS_SES_VERIFIED_DOMAIN]
-                )
-                
+            
+            # Check domain verification
+            if isinstance(domain_response, Exception):
+                results['errors'].append(f"API test failed: {domain_response}")
+            else:
                 domain_status = domain_response.get('VerificationAttributes', {}).get(
                     self.settings.AWS_SES_VERIFIED_DOMAIN, {}
                 ).get('VerificationStatus', 'NotStarted')
                 
                 results['domain_verified'] = domain_status == 'Success'
-                
-            except Exception as e:
-                results['errors'].append(f"API test failed: {e}")
         
         # Test SMTP connection
-        try:
-            smtp_config = self.settings.get_smtp_config()
-            if smtp_config['username'] and smtp_config['password']:
-                print("testing smtp connection...")
-                results['smtp_test'] = await self._test_smtp_connection(smtp_config, results)
+        if smtp_result is None:
+            results['errors'].append("SMTP credentials not configured")
+        elif isinstance(smtp_result, smtplib.SMTPAuthenticationError):
+            error_msg = f"SMTP Authentication failed: {smtp_result}"
+            results['errors'].append(error_msg)
+            print(f"❌ {error_msg}")
+        elif isinstance(smtp_result, Exception):
+            # If API test passed but SMTP failed, provide specific guidance
+            if results.get('api_test', False):
+                error_msg = (
+                    f"SMTP connection failed: {smtp_result}\n"
+                    "⚠️ SMTP port 465 may be blocked by Windows Firewall, but AWS SES API works fine.\n"
+                    "✅ Your system can still send emails via AWS SES API.\n"
+                    "🔧 To enable SMTP: Run as Administrator: New-NetFirewallRule -DisplayName 'AWS SES SMTP' -Direction Outbound -Protocol TCP -RemotePort 465 -Action Allow"
+                )
             else:
-                results['errors'].append("SMTP credentials not configured")
-                
-        except Exception as e:
-            results['errors'].append(f"SMTP test failed: {e}")
+                error_msg = f"SMTP connection failed: {smtp_result}"
+            
+            results['errors'].append(error_msg)
+            print(f"❌ {error_msg}")
+        else:
+            results['smtp_test'] = True
         
         return results
     
+    async def _get_smtp_connection(self, smtp_config: Dict[str, Any]) -> list:
+        """Check out an idle [server, uses] pool entry, skipping dead or worn-out sessions (call under the SMTP slot semaphore)"""
+        idle = AWSSESHandler._smtp_idle
+        while idle:
+            # Most recently used first, so idle sessions beyond the current load age out
+            entry = idle.pop()
+            if entry[1] >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+                logger.info(f"♻️ Recycling AWS SES SMTP connection after {entry[1]} messages")
+                await asyncio.to_thread(AWSSESHandler._quit_smtp, entry[0])
+                continue
+            try:
+                await asyncio.to_thread(entry[0].noop)
+                return entry
+            except Exception:
+                logger.info("🔌 Pooled AWS SES SMTP connection dropped, reconnecting")
+                await asyncio.to_thread(AWSSESHandler._quit_smtp, entry[0])
+        
+        return [await self._create_smtp_connection(smtp_config), 0]
+    
+    @staticmethod
+    def _quit_smtp(server):
+        """Quit an SMTP session, closing the socket if QUIT fails"""
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+    
+    @staticmethod
+    def _close_smtp_connections():
+        """Quit and forget every idle pooled SMTP session"""
+        idle = AWSSESHandler._smtp_idle
+        while idle:
+            AWSSESHandler._quit_smtp(idle.pop()[0])
+    
     async def _create_smtp_connection(self, smtp_config: Dict[str, Any]):
         """Create AWS SES SMTP connection using port 465 (SSL)"""
         try:
             logger.info(f"🔍 Connecting to AWS SES SMTP on port 465")
             
-            # Create SSL connection directly to port 465
-            context = ssl.create_default_context()
-            server = smtplib.SMTP_SSL(smtp_config['smtp_server'], 465, timeout=30, context=context)
-            logger.info(f"🔐 Connected with SSL")
+            def connect_and_login():
+                # Create SSL connection directly to port 465
+                server = PipelinedSMTP(smtp_config['smtp_server'], 465, timeout=30, context=_SSL_CONTEXT)
+                logger.info(f"🔐 Connected with SSL{' (resumed session)' if server.sock.session_reused else ''}")
+                
+                # Login with SES SMTP credentials
+                logger.info(f"🔑 Authenticating...")
+                server.login(smtp_config['username'], smtp_config['password'])
+                
+                # Keep the TLS session (tickets arrive after the handshake) for the next reconnect
+                PipelinedSMTP._tls_session = server.sock.session
+                return server
             
-            # Login with SES SMTP credentials
-            logger.info(f"🔑 Authenticating...")
-            server.login(smtp_config['username'], smtp_config['password'])
+            # Handshake and AUTH are blocking, so run them off the event loop
+            server = await asyncio.to_thread(connect_and_login)
             
             logger.info(f"✅ AWS SES SMTP connection successful")
             return server
@@ -328,44 +987,20 @@ class AWSSESHandler:
             logger.error(f"❌ AWS SES SMTP connection failed: {e}")
             raise Exception(f"Failed to connect to AWS SES SMTP: {e}")
     
-    async def _test_smtp_connection(self, smtp_config: Dict[str, Any], results: Dict[str, Any]) -> bool:
-        """Test AWS SES SMTP connection using port 465 (SSL)"""
-        try:
-            print(f"🔍 Testing AWS SES SMTP connection on port 465")
-            
-            # Test SMTP connection directly on port 465
-            context = ssl.create_default_context()
-            server = smtplib.SMTP_SSL(smtp_config['smtp_server'], 465, timeout=30, context=context)
-            print("🔐 Connected with SSL")
-            
-            print("🔑 Attempting login...")
-            server.login(smtp_config['username'], smtp_config['password'])
-            
-            print("✅ SMTP connection successful!")
-            server.quit()
-            return True
-            
-        except smtplib.SMTPAuthenticationError as e:
-            error_msg = f"SMTP Authentication failed: {e}"
-            results['errors'].append(error_msg)
-            print(f"❌ {error_msg}")
-            return False
-            
-        except Exception as e:
-            # If API test passed but SMTP failed, provide specific guidance
-            if results.get('api_test', False):
-                error_msg = (
-                    f"SMTP connection failed: {e}\n"
-                    "⚠️ SMTP port 465 may be blocked by Windows Firewall, but AWS SES API works fine.\n"
-                    "✅ Your system can still send emails via AWS SES API.\n"
-                    "🔧 To enable SMTP: Run as Administrator: New-NetFirewallRule -DisplayName 'AWS SES SMTP' -Direction Outbound -Protocol TCP -RemotePort 465 -Action Allow"
-                )
-            else:
-                error_msg = f"SMTP connection failed: {e}"
-            
-            results['errors'].append(error_msg)
-            print(f"❌ {error_msg}")
-            return False
+    def _smtp_login_probe(self, smtp_config: Dict[str, Any]) -> bool:
+        """Connect and log in to AWS SES SMTP on port 465 (SSL); raises on failure"""
+        print(f"🔍 Testing AWS SES SMTP connection on port 465")
+        
+        # Test SMTP connection directly on port 465
+        server = smtplib.SMTP_SSL(smtp_config['smtp_server'], 465, timeout=30, context=_SSL_CONTEXT)
+        print("🔐 Connected with SSL")
+        
+        print("🔑 Attempting login...")
+        server.login(smtp_config['username'], smtp_config['password'])
+        
+        print("✅ SMTP connection successful!")
+        server.quit()
+        return True
     
     async def get_sending_statistics(self) -> Dict[str, Any]:
         """Get AWS SES sending statistics"""
@@ -373,11 +1008,11 @@ class AWSSESHandler:
             return {'error': 'SES client not initialized'}
         
         try:
-            # Get quota
-            quota = self.ses_client.get_send_quota()
-            
-            # Get statistics
-            stats = self.ses_client.get_send_statistics()
+            # Fetch quota and statistics concurrently off the event loop
+            quota, stats = await asyncio.gather(
+                asyncio.to_thread(self.ses_client.get_send_quota),
+                asyncio.to_thread(self.ses_client.get_send_statistics)
+            )
             
             return {
                 'quota': quota,
@@ -390,6 +1025,16 @@ class AWSSESHandler:
             return {'error': str(e)}
 
 
+# Close the pooled SMTP sessions cleanly on interpreter shutdown
+atexit.register(AWSSESHandler._close_smtp_connections)
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_aws_handler() -> AWSSESHandler:
+    """Process-wide AWSSESHandler, built on first use"""
+    return AWSSESHandler()
+
+
 # Alternative SMTP-only handler for compatibility
 class AWSSESSMTPHandler:
     """AWS SES SMTP-only handler for drop-in replacement"""
@@ -416,14 +1061,12 @@ class AWSSESSMTPHandler:
         attachments: List[dict] = None
     ) -> bool:
         """Send email via AWS SES SMTP (compatible with existing SMTPHandler interface)"""
-        aws_handler = AWSSESHandler()
-        return await aws_handler._send_via_smtp(
+        return await _shared_aws_handler()._send_via_smtp(
             from_email, to_emails, subject, body, html_body,
             cc_emails, bcc_emails, attachments
         )
     
     async def test_connection(self) -> bool:
         """Test AWS SES SMTP connection"""
-        aws_handler = AWSSESHandler()
-        results = await aws_handler.test_connection()
+        results = await _shared_aws_handler().test_connection()
         return results.get('smtp_test', False)
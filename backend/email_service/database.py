@@ -1,17 +1,86 @@
+import asyncio
 import uuid
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from supabase import create_client, Client
+from typing import List, Optional, Dict, Any, Iterable
+import time
+from collections import OrderedDict
+from supabase import Client
 from .models import EmailMessage, EmailStatus, EmailPriority, EmailAddress, EmailAttachment
 from shared.config import settings
+from shared.database import get_supabase
 from shared.elasticsearch_service import elasticsearch_service
 import redis
 import json
 from datetime import timedelta
+from pydantic import TypeAdapter
 
 # Helper function for user data enrichment
 
-supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+# The process-wide client, shared with the attachment handler and SMTP receive server
+supabase: Client = get_supabase()
+
+# Columns for list views; html_body is only loaded when an email is opened (get_email_by_id)
+EMAIL_LIST_COLUMNS = (
+    "id,user_id,subject,body,from_address,to_addresses,cc_addresses,bcc_addresses,attachments,"
+    "status,priority,is_read,is_starred,thread_id,created_at,updated_at,sent_at,received_at"
+)
+
+# Attachment fields persisted on the email row; bytes live in object storage and
+# URLs are re-signed on read by enrich_email_with_user_data
+ATTACHMENT_RECORD_FIELDS = ("id", "filename", "content_type", "size")
+
+# Rows per POST in EmailDatabase.create_emails
+EMAIL_INSERT_BATCH_SIZE = 500
+
+# In-process cache of opened emails: max entries and seconds before re-reading
+EMAIL_CACHE_SIZE = 10000
+EMAIL_CACHE_TTL = 300
+
+# Keys per SCAN step when invalidating a user's cached listings
+REDIS_SCAN_BATCH = 500
+
+# Seconds to cache folder counts in Redis (invalidate_user_cache also clears them)
+EMAIL_COUNT_CACHE_TTL = 30
+
+# Seconds to wait before refreshing folder badges, so a burst of mutations costs one refresh
+FOLDER_COUNT_REFRESH_DELAY = 0.5
+
+# Folder name -> (column, value) filter shared by get_emails and get_email_count;
+# unknown folders are not filtered
+_FOLDER_FILTERS = {
+    "inbox": ("status", EmailStatus.RECEIVED.value),
+    "sent": ("status", EmailStatus.SENT.value),
+    "drafts": ("status", EmailStatus.DRAFT.value),
+    "trash": ("status", EmailStatus.TRASH.value),
+    "starred": ("is_starred", True),
+}
+
+# Folders whose membership depends on status; a status change can only move counts between these
+STATUS_FOLDERS = frozenset(folder for folder, (column, _) in _FOLDER_FILTERS.items() if column == "status")
+
+# Serializers for address fields; callers pass EmailAddress models or plain dicts,
+# which dump_python passes through unchanged with warnings off
+_ONE_ADDR = TypeAdapter(EmailAddress)
+_ADDR_ADAPTER = TypeAdapter(List[EmailAddress])
+
+
+def _folders_for_record(record: Dict[str, Any]) -> set:
+    """Folders a newly created emails row is counted in"""
+    return {folder for folder, (column, value) in _FOLDER_FILTERS.items() if record.get(column) == value}
+
+
+async def _execute(query):
+    """Run a PostgREST request in a worker thread so it does not block the event loop"""
+    return await asyncio.to_thread(query.execute)
+
+
+def _attachment_records(attachments: List[Any]) -> List[Dict[str, Any]]:
+    """Reduce attachments to the metadata stored in the emails.attachments column"""
+    records = []
+    for attachment in attachments:
+        attachment_dict = attachment.dict() if hasattr(attachment, 'dict') else attachment
+        records.append({field: attachment_dict.get(field) for field in ATTACHMENT_RECORD_FIELDS})
+    return records
 
 
 def get_user_by_id(user_id: str) -> Optional[Dict]:
@@ -63,7 +132,7 @@ async def enrich_email_with_user_data(email_data: Dict) -> Dict:
                 user_id_to_lookup = from_email.split("@")[0]
             
             if user_id_to_lookup:
-                user_data = get_user_by_id(user_id_to_lookup)
+                user_data = await asyncio.to_thread(get_user_by_id, user_id_to_lookup)
                 
                 if user_data:
                     # Create full name
@@ -103,7 +172,7 @@ async def enrich_email_with_user_data(email_data: Dict) -> Dict:
                         
                         if user_id_to_lookup:
                             # Look up by user_id
-                            user_data = get_user_by_id(user_id_to_lookup)
+                            user_data = await asyncio.to_thread(get_user_by_id, user_id_to_lookup)
                             if user_data:
                                 first_name = user_data.get("first_name", "")
                                 last_name = user_data.get("last_name", "")
@@ -119,7 +188,7 @@ async def enrich_email_with_user_data(email_data: Dict) -> Dict:
                                 enriched_addresses.append(addr)
                         else:
                             # Not a user_id, check if it's a real email in our users table
-                            user_data = get_user_by_email(addr_email)
+                            user_data = await asyncio.to_thread(get_user_by_email, addr_email)
                             if user_data:
                                 first_name = user_data.get("first_name", "")
                                 last_name = user_data.get("last_name", "")
@@ -179,6 +248,14 @@ async def enrich_email_with_user_data(email_data: Dict) -> Dict:
 class EmailDatabase:
     _redis_client = None
     
+    # (user_id, email_id) -> (EmailMessage, expiry), least recently used first
+    _email_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+    
+    # user_id -> pending folder-count refresh; also keeps the tasks referenced until they finish
+    _folder_count_tasks: Dict[str, asyncio.Task] = {}
+    # user_id -> folders the pending refresh must recompute (None means all of them)
+    _folder_count_pending: Dict[str, Optional[set]] = {}
+    
     @classmethod
     def get_redis_client(cls):
         """Get Redis client with lazy initialization"""
@@ -192,25 +269,53 @@ class EmailDatabase:
                 cls._redis_client = None
         return cls._redis_client
     
+    @classmethod
+    def forget_email(cls, email_id: str, user_id: str):
+        """Drop an email from the in-process cache after it changes"""
+        cls._email_cache.pop((user_id, email_id), None)
+    
+    @classmethod
+    def schedule_folder_counts(cls, user_id: str, folders: Optional[Iterable[str]] = None):
+        """Refresh a user's folder counts in the background, coalescing repeated calls"""
+        if user_id not in cls._folder_count_tasks:
+            cls._folder_count_pending[user_id] = None if folders is None else set(folders)
+            cls._folder_count_tasks[user_id] = asyncio.create_task(cls._refresh_folder_counts_later(user_id))
+        elif folders is None:
+            cls._folder_count_pending[user_id] = None
+        elif cls._folder_count_pending.get(user_id) is not None:
+            cls._folder_count_pending[user_id].update(folders)
+    
+    @classmethod
+    async def _refresh_folder_counts_later(cls, user_id: str):
+        """Wait out a burst of mutations, then run one folder-count refresh"""
+        try:
+            await asyncio.sleep(FOLDER_COUNT_REFRESH_DELAY)
+        finally:
+            # Mutations from here on schedule a fresh refresh
+            cls._folder_count_tasks.pop(user_id, None)
+            folders = cls._folder_count_pending.pop(user_id, None)
+        await cls.update_folder_counts(user_id, folders)
+    
+    @staticmethod
+    async def warm_up():
+        """Open the PostgREST connection before the first request needs it"""
+        await _execute(supabase.table("emails").select("id").limit(1))
+    
     @staticmethod
     def _get_cache_key(user_id: str, folder: str, page: int, limit: int, search: str = None) -> str:
         """Generate cache key for email queries"""
         search_part = f":search:{search}" if search else ""
         return f"emails:{user_id}:{folder}:{page}:{limit}{search_part}"
     @staticmethod
-    async def create_email(email_data: Dict[str, Any], user_id: str) -> EmailMessage:
-        """Create a new email in the database"""
-        email_id = str(uuid.uuid4())
-        now = datetime.utcnow()
-        
+    def _build_email_record(email_data: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """Build the emails row for a new email; id and timestamps come from column defaults"""
         # Convert EmailAddress objects to dictionaries for storage
-        from_address_dict = email_data["from_address"].dict() if hasattr(email_data["from_address"], 'dict') else email_data["from_address"]
-        to_addresses_dict = [addr.dict() if hasattr(addr, 'dict') else addr for addr in email_data["to_addresses"]]
-        cc_addresses_dict = [addr.dict() if hasattr(addr, 'dict') else addr for addr in email_data.get("cc_addresses", [])]
-        bcc_addresses_dict = [addr.dict() if hasattr(addr, 'dict') else addr for addr in email_data.get("bcc_addresses", [])]
+        from_address_dict = _ONE_ADDR.dump_python(email_data["from_address"], warnings=False)
+        to_addresses_dict = _ADDR_ADAPTER.dump_python(email_data["to_addresses"], warnings=False)
+        cc_addresses_dict = _ADDR_ADAPTER.dump_python(email_data.get("cc_addresses", []), warnings=False)
+        bcc_addresses_dict = _ADDR_ADAPTER.dump_python(email_data.get("bcc_addresses", []), warnings=False)
         
         email_record = {
-            "id": email_id,
             "user_id": user_id,
             "subject": email_data["subject"],
             "body": email_data["body"],
@@ -219,19 +324,22 @@ class EmailDatabase:
             "to_addresses": to_addresses_dict,
             "cc_addresses": cc_addresses_dict,
             "bcc_addresses": bcc_addresses_dict,
-            "attachments": email_data.get("attachments", []),
+            "attachments": _attachment_records(email_data.get("attachments", [])),
             "status": email_data["status"],
             "priority": email_data.get("priority", EmailPriority.NORMAL),
             "is_read": email_data.get("is_read", False),
             "is_starred": email_data.get("is_starred", False),
             "thread_id": email_data.get("thread_id"),
-            "created_at": now.isoformat(),
-            "updated_at": now.isoformat(),
             "sent_at": email_data.get("sent_at").isoformat() if email_data.get("sent_at") else None,
             "received_at": email_data.get("received_at")
         }
-        
-        result = supabase.table("emails").insert(email_record).execute()
+        return email_record
+
+    @staticmethod
+    async def create_email(email_data: Dict[str, Any], user_id: str) -> EmailMessage:
+        """Create a new email in the database"""
+        email_record = EmailDatabase._build_email_record(email_data, user_id)
+        result = await _execute(supabase.table("emails").insert(email_record))
         
         if result.data:
             # Index the email in Elasticsearch
@@ -243,11 +351,38 @@ class EmailDatabase:
             # Invalidate cache for this user
             EmailDatabase.invalidate_user_cache(user_id)
             # Update folder counts after creating email
-            await EmailDatabase.update_folder_counts(user_id)
+            EmailDatabase.schedule_folder_counts(user_id, _folders_for_record(result.data[0]))
             return EmailMessage(**result.data[0])
         else:
             raise Exception("Failed to create email")
 
+    @staticmethod
+    async def create_emails(entries: List[tuple]) -> List[EmailMessage]:
+        """Create many emails with batched inserts; entries are (email_data, user_id) pairs"""
+        records = [EmailDatabase._build_email_record(email_data, user_id) for email_data, user_id in entries]
+        
+        created = []
+        for start in range(0, len(records), EMAIL_INSERT_BATCH_SIZE):
+            result = await _execute(supabase.table("emails").insert(records[start:start + EMAIL_INSERT_BATCH_SIZE]))
+            created.extend(result.data or [])
+        
+        if created:
+            # Index all new emails in Elasticsearch with one bulk request
+            try:
+                await elasticsearch_service.bulk_index_emails(created)
+            except Exception as e:
+                print(f"Failed to index emails in Elasticsearch: {e}")
+            
+            # Refresh each affected mailbox once, however many rows it received
+            folders_by_user: Dict[str, set] = {}
+            for record in created:
+                folders_by_user.setdefault(record["user_id"], set()).update(_folders_for_record(record))
+            for user_id, folders in folders_by_user.items():
+                EmailDatabase.invalidate_user_cache(user_id)
+                EmailDatabase.schedule_folder_counts(user_id, folders)
+        
+        return [EmailMessage(**record) for record in created]
+
     @staticmethod
     async def get_emails_from_cache_or_db(
         user_id: str,
@@ -257,11 +392,12 @@ class EmailDatabase:
         search: Optional[str] = None,
         status: Optional[EmailStatus] = None,
         is_read: Optional[bool] = None,
-        is_starred: Optional[bool] = None
+        is_starred: Optional[bool] = None,
+        cursor: Optional[str] = None
     ) -> List[EmailMessage]:
         """Get emails with caching support"""
         # Only cache simple queries (no search, first page)
-        should_cache = not search and page == 1 and not status and is_read is None and is_starred is None
+        should_cache = not search and page == 1 and not cursor and not status and is_read is None and is_starred is None
         
         if should_cache:
             redis_client = EmailDatabase.get_redis_client()
@@ -291,7 +427,7 @@ class EmailDatabase:
         
         # Get from database
         emails = await EmailDatabase.get_emails(
-            user_id, folder, page, limit, search, status, is_read, is_starred
+            user_id, folder, page, limit, search, status, is_read, is_starred, cursor
         )
         
         # Cache the results for 5 minutes (only simple queries)
@@ -328,9 +464,10 @@ class EmailDatabase:
             try:
                 # Find all keys for this user
                 pattern = f"emails:{user_id}:*"
-                keys = redis_client.keys(pattern)
+                # SCAN in batches rather than KEYS, which blocks Redis while it walks the whole keyspace
+                keys = list(redis_client.scan_iter(match=pattern, count=REDIS_SCAN_BATCH))
                 if keys:
-                    redis_client.delete(*keys)
+                    redis_client.unlink(*keys)
                     print(f"Invalidated {len(keys)} cache entries for user {user_id}")
             except Exception as e:
                 print(f"Cache invalidation error: {e}")
@@ -343,9 +480,10 @@ class EmailDatabase:
             try:
                 # Find all keys for this user and folder
                 pattern = f"emails:{user_id}:{folder}:*"
-                keys = redis_client.keys(pattern)
+                # SCAN in batches rather than KEYS, which blocks Redis while it walks the whole keyspace
+                keys = list(redis_client.scan_iter(match=pattern, count=REDIS_SCAN_BATCH))
                 if keys:
-                    redis_client.delete(*keys)
+                    redis_client.unlink(*keys)
                     print(f"Invalidated {len(keys)} cache entries for user {user_id}, folder {folder}")
             except Exception as e:
                 print(f"Cache invalidation error: {e}")
@@ -359,9 +497,10 @@ class EmailDatabase:
         search: Optional[str] = None,
         status: Optional[EmailStatus] = None,
         is_read: Optional[bool] = None,
-        is_starred: Optional[bool] = None
+        is_starred: Optional[bool] = None,
+        cursor: Optional[str] = None
     ) -> List[EmailMessage]:
-        """Get emails for a user with filtering and pagination"""
+        """Get emails for a user with filtering and pagination (keyset when a cursor is given)"""
         
         # If search is provided, use Elasticsearch
         if search:
@@ -384,36 +523,29 @@ class EmailDatabase:
                 
                 # Fetch the actual email data from Supabase using the IDs from Elasticsearch
                 email_ids = search_result["email_ids"]
-                result = supabase.table("emails").select("*").in_("id", email_ids).execute()
+                result = await _execute(supabase.table("emails").select(EMAIL_LIST_COLUMNS).in_("id", email_ids))
                 
                 # Sort the results to match the order from Elasticsearch
                 email_map = {email["id"]: email for email in result.data}
-                emails = []
-                for email_id in email_ids:
-                    if email_id in email_map:
-                        enriched_record = await enrich_email_with_user_data(email_map[email_id])
-                        emails.append(EmailMessage(**enriched_record))
+                ordered_records = [email_map[email_id] for email_id in email_ids if email_id in email_map]
                 
-                return emails
+                # Enrich all rows concurrently; each does its own user/attachment lookups
+                enriched_records = await asyncio.gather(
+                    *(enrich_email_with_user_data(record) for record in ordered_records)
+                )
+                return [EmailMessage(**record) for record in enriched_records]
                 
             except Exception as e:
                 print(f"❌ [FALLBACK] Elasticsearch search failed, falling back to Supabase: {e}")
                 # Fall back to Supabase search if Elasticsearch fails
         
         # Use Supabase for non-search queries or as fallback
-        query = supabase.table("emails").select("*").eq("user_id", user_id)
+        query = supabase.table("emails").select(EMAIL_LIST_COLUMNS).eq("user_id", user_id)
         
         # Apply folder filter
-        if folder == "inbox":
-            query = query.eq("status", EmailStatus.RECEIVED.value)
-        elif folder == "sent":
-            query = query.eq("status", EmailStatus.SENT.value)
-        elif folder == "drafts":
-            query = query.eq("status", EmailStatus.DRAFT.value)
-        elif folder == "trash":
-            query = query.eq("status", EmailStatus.TRASH.value)
-        elif folder == "starred":
-            query = query.eq("is_starred", True)
+        folder_filter = _FOLDER_FILTERS.get(folder)
+        if folder_filter:
+            query = query.eq(*folder_filter)
         
         # Apply additional filters
         if status:
@@ -423,52 +555,84 @@ class EmailDatabase:
         if is_starred is not None:
             query = query.eq("is_starred", is_starred)
         
-        # Apply search (fallback to Supabase ilike)
+        # Apply search (fallback to the Postgres full-text index, see migrations/004_email_search.sql)
         if search:
-            print(f"🔍 [SUPABASE] Using ilike search for: '{search}'")
-            query = query.or_(f"subject.ilike.%{search}%,body.ilike.%{search}%")
-        
-        # Apply pagination
-        offset = (page - 1) * limit
-        query = query.range(offset, offset + limit - 1)
-        
-        # Order by date
-        query = query.order("created_at", desc=True)
+            print(f"🔍 [SUPABASE] Using full-text search for: '{search}'")
+            query = query.text_search("search_vec", search, options={"config": "simple", "type": "websearch"})
+        
+        # Apply pagination: seek past the cursor row instead of skipping OFFSET rows
+        if cursor:
+            created_at, email_id = EmailDatabase.parse_cursor(cursor)
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{email_id})'
+            ).limit(limit)
+        else:
+            offset = (page - 1) * limit
+            query = query.range(offset, offset + limit - 1)
         
-        result = query.execute()
+        # Order by date (id breaks ties so cursors are stable)
+        query = query.order("created_at", desc=True).order("id", desc=True)
         
-        emails = []
-        for record in result.data:
-            # Enrich email data with proper user information
-            enriched_record = await enrich_email_with_user_data(record)
-            emails.append(EmailMessage(**enriched_record))
+        result = await _execute(query)
         
-        return emails
+        # Enrich email data with proper user information, all rows concurrently
+        enriched_records = await asyncio.gather(
+            *(enrich_email_with_user_data(record) for record in result.data)
+        )
+        return [EmailMessage(**record) for record in enriched_records]
+
+    @staticmethod
+    def make_cursor(email: EmailMessage) -> str:
+        """Keyset cursor pointing just past the given email"""
+        return f"{email.created_at.isoformat()}|{email.id}"
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> tuple:
+        """Split a cursor into (created_at, id), validating both parts"""
+        created_at, _, email_id = cursor.rpartition("|")
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(email_id))
 
     @staticmethod
     async def get_email_by_id(email_id: str, user_id: str) -> Optional[EmailMessage]:
         """Get a specific email by ID"""
-        result = supabase.table("emails").select("*").eq("id", email_id).eq("user_id", user_id).execute()
-        
-        if result.data:
+        cache = EmailDatabase._email_cache
+        cache_key = (user_id, email_id)
+        cached = cache.get(cache_key)
+        if cached and cached[1] > time.monotonic():
+            cache.move_to_end(cache_key)
+            # Callers may modify the returned model (e.g. is_read), so never hand out the cached one
+            return cached[0].model_copy(deep=True)
+        
+        # At most one row matches (id, user_id), so ask PostgREST for a single object
+        result = await _execute(supabase.table("emails").select("*").eq("id", email_id).eq("user_id", user_id).maybe_single())
+        
+        # Depending on the postgrest version, a missing row is None or a response with data None
+        if result and result.data:
             # Enrich email data with proper user information
-            enriched_record = await enrich_email_with_user_data(result.data[0])
-            return EmailMessage(**enriched_record)
+            enriched_record = await enrich_email_with_user_data(result.data)
+            email = EmailMessage(**enriched_record)
+            
+            cache[cache_key] = (email.model_copy(deep=True), time.monotonic() + EMAIL_CACHE_TTL)
+            cache.move_to_end(cache_key)
+            while len(cache) > EMAIL_CACHE_SIZE:
+                cache.popitem(last=False)
+            return email
         return None
 
     @staticmethod
     async def update_email_status(email_id: str, user_id: str, status: EmailStatus) -> bool:
         """Update email status"""
-        result = supabase.table("emails").update({
-            "status": status,
-            "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", email_id).eq("user_id", user_id).execute()
+        # Only the affected-row count is needed, not the updated row
+        result = await _execute(supabase.table("emails").update({
+            "status": status
+        }, returning="minimal", count="exact").eq("id", email_id).eq("user_id", user_id))
         
-        if len(result.data) > 0:
+        if result.count:
             # Invalidate cache for this user
+            EmailDatabase.forget_email(email_id, user_id)
             EmailDatabase.invalidate_user_cache(user_id)
             # Update folder counts after status change
-            await EmailDatabase.update_folder_counts(user_id)
+            EmailDatabase.schedule_folder_counts(user_id, STATUS_FOLDERS)
             return True
         return False
 
@@ -478,10 +642,10 @@ class EmailDatabase:
         now = datetime.utcnow()
         
         # Convert EmailAddress objects to dictionaries for storage
-        from_address_dict = email_data["from_address"].dict() if hasattr(email_data["from_address"], 'dict') else email_data["from_address"]
-        to_addresses_dict = [addr.dict() if hasattr(addr, 'dict') else addr for addr in email_data["to_addresses"]]
-        cc_addresses_dict = [addr.dict() if hasattr(addr, 'dict') else addr for addr in email_data.get("cc_addresses", [])]
-        bcc_addresses_dict = [addr.dict() if hasattr(addr, 'dict') else addr for addr in email_data.get("bcc_addresses", [])]
+        from_address_dict = _ONE_ADDR.dump_python(email_data["from_address"], warnings=False)
+        to_addresses_dict = _ADDR_ADAPTER.dump_python(email_data["to_addresses"], warnings=False)
+        cc_addresses_dict = _ADDR_ADAPTER.dump_python(email_data.get("cc_addresses", []), warnings=False)
+        bcc_addresses_dict = _ADDR_ADAPTER.dump_python(email_data.get("bcc_addresses", []), warnings=False)
         
         update_data = {
             "subject": email_data["subject"],
@@ -491,17 +655,16 @@ class EmailDatabase:
             "to_addresses": to_addresses_dict,
             "cc_addresses": cc_addresses_dict,
             "bcc_addresses": bcc_addresses_dict,
-            "attachments": email_data.get("attachments", []),
+            "attachments": _attachment_records(email_data.get("attachments", [])),
             "status": email_data["status"],
             "priority": email_data.get("priority", EmailPriority.NORMAL),
-            "updated_at": now.isoformat(),
         }
         
         # Only update sent_at if the email is being sent
         if email_data["status"] == EmailStatus.SENT:
             update_data["sent_at"] = now.isoformat()
         
-        result = supabase.table("emails").update(update_data).eq("id", email_id).eq("user_id", user_id).execute()
+        result = await _execute(supabase.table("emails").update(update_data).eq("id", email_id).eq("user_id", user_id))
         
         if result.data:
             # Update the email in Elasticsearch
@@ -511,28 +674,30 @@ class EmailDatabase:
                 print(f"Failed to update email in Elasticsearch: {e}")
             
             # Invalidate cache for this user when email is updated
+            EmailDatabase.forget_email(email_id, user_id)
             EmailDatabase.invalidate_user_cache(user_id)
-            # Update folder counts after updating email
-            await EmailDatabase.update_folder_counts(user_id)
+            # Update folder counts after updating email (the star flag is not part of the update)
+            EmailDatabase.schedule_folder_counts(user_id, STATUS_FOLDERS)
             return EmailMessage(**result.data[0])
         return None
 
     @staticmethod
     async def mark_as_read(email_id: str, user_id: str, is_read: bool = True) -> bool:
         """Mark email as read/unread"""
-        result = supabase.table("emails").update({
-            "is_read": is_read,
-            "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", email_id).eq("user_id", user_id).execute()
+        # Only the affected-row count is needed, not the updated row
+        result = await _execute(supabase.table("emails").update({
+            "is_read": is_read
+        }, returning="minimal", count="exact").eq("id", email_id).eq("user_id", user_id))
         
-        if len(result.data) > 0:
+        if result.count:
             # Update the email in Elasticsearch
             try:
-                await elasticsearch_service.update_email(email_id, result.data[0])
+                await elasticsearch_service.update_email_fields(email_id, {"is_read": is_read})
             except Exception as e:
                 print(f"Failed to update email in Elasticsearch: {e}")
             
             # Invalidate cache for this user when read status changes
+            EmailDatabase.forget_email(email_id, user_id)
             EmailDatabase.invalidate_user_cache(user_id)
             return True
         return False
@@ -540,54 +705,144 @@ class EmailDatabase:
     @staticmethod
     async def toggle_star(email_id: str, user_id: str) -> bool:
         """Toggle email star status"""
-        # First get current star status
-        email = await EmailDatabase.get_email_by_id(email_id, user_id)
-        if not email:
-            return False
-        
-        new_star_status = not email.is_starred
-        
-        result = supabase.table("emails").update({
-            "is_starred": new_star_status,
-            "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", email_id).eq("user_id", user_id).execute()
+        # Flip the flag in one UPDATE (see migrations/002_toggle_star.sql)
+        result = await _execute(supabase.rpc("toggle_star", {
+            "p_email_id": email_id,
+            "p_user_id": user_id
+        }))
         
         if len(result.data) > 0:
             # Update the email in Elasticsearch
             try:
-                await elasticsearch_service.update_email(email_id, result.data[0])
+                await elasticsearch_service.update_email_fields(email_id, result.data[0])
             except Exception as e:
                 print(f"Failed to update email in Elasticsearch: {e}")
             
             # Invalidate cache for this user when star status changes
+            EmailDatabase.forget_email(email_id, user_id)
             EmailDatabase.invalidate_user_cache(user_id)
-            # Update folder counts after star toggle
-            await EmailDatabase.update_folder_counts(user_id)
+            # Update folder counts after star toggle; only the starred folder can change
+            EmailDatabase.schedule_folder_counts(user_id, ["starred"])
             return True
         return False
 
     @staticmethod
     async def delete_email(email_id: str, user_id: str) -> bool:
         """Delete email (move to trash)"""
-        result = supabase.table("emails").update({
-            "status": EmailStatus.TRASH.value,
-            "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", email_id).eq("user_id", user_id).execute()
+        # Only the affected-row count is needed, not the updated row
+        result = await _execute(supabase.table("emails").update({
+            "status": EmailStatus.TRASH.value
+        }, returning="minimal", count="exact").eq("id", email_id).eq("user_id", user_id))
         
-        if len(result.data) > 0:
+        if result.count:
             # Update the email in Elasticsearch
             try:
-                await elasticsearch_service.update_email(email_id, result.data[0])
+                await elasticsearch_service.update_email_fields(email_id, {"status": EmailStatus.TRASH.value})
             except Exception as e:
                 print(f"Failed to update email in Elasticsearch: {e}")
             
             # Invalidate cache for this user when email is deleted
+            EmailDatabase.forget_email(email_id, user_id)
             EmailDatabase.invalidate_user_cache(user_id)
             # Update folder counts after moving to trash
-            await EmailDatabase.update_folder_counts(user_id)
+            EmailDatabase.schedule_folder_counts(user_id, STATUS_FOLDERS)
             return True
         return False
 
+    @staticmethod
+    async def _owned_email_ids(email_ids: List[str], user_id: str, matched: int) -> List[str]:
+        """IDs from a bulk update that belong to the user, so other users' index entries are never touched"""
+        unique_ids = list(dict.fromkeys(email_ids))
+        if matched >= len(unique_ids):
+            # Every requested ID matched the user_id filter
+            return unique_ids
+        result = await _execute(supabase.table("emails").select("id").in_("id", unique_ids).eq("user_id", user_id))
+        return [record["id"] for record in result.data]
+
+    @staticmethod
+    async def mark_as_read_bulk(email_ids: List[str], user_id: str, is_read: bool = True) -> int:
+        """Mark several emails as read/unread with one UPDATE; returns how many changed"""
+        if not email_ids:
+            return 0
+        
+        # Only the affected-row count is needed, not the updated rows
+        result = await _execute(supabase.table("emails").update({
+            "is_read": is_read
+        }, returning="minimal", count="exact").in_("id", email_ids).eq("user_id", user_id))
+        
+        if result.count:
+            updated_ids = await EmailDatabase._owned_email_ids(email_ids, user_id, result.count)
+            # Patch the changed flag in Elasticsearch with one bulk request
+            try:
+                await elasticsearch_service.bulk_update_email_fields({email_id: {"is_read": is_read} for email_id in updated_ids})
+            except Exception as e:
+                print(f"Failed to update emails in Elasticsearch: {e}")
+            
+            for email_id in updated_ids:
+                EmailDatabase.forget_email(email_id, user_id)
+            EmailDatabase.invalidate_user_cache(user_id)
+        return result.count or 0
+
+    @staticmethod
+    async def delete_emails_bulk(email_ids: List[str], user_id: str) -> int:
+        """Move several emails to trash with one UPDATE; returns how many moved"""
+        if not email_ids:
+            return 0
+        
+        # Only the affected-row count is needed, not the updated rows
+        result = await _execute(supabase.table("emails").update({
+            "status": EmailStatus.TRASH.value
+        }, returning="minimal", count="exact").in_("id", email_ids).eq("user_id", user_id))
+        
+        if result.count:
+            updated_ids = await EmailDatabase._owned_email_ids(email_ids, user_id, result.count)
+            # Patch the changed status in Elasticsearch with one bulk request
+            try:
+                await elasticsearch_service.bulk_update_email_fields(
+                    {email_id: {"status": EmailStatus.TRASH.value} for email_id in updated_ids}
+                )
+            except Exception as e:
+                print(f"Failed to update emails in Elasticsearch: {e}")
+            
+            for email_id in updated_ids:
+                EmailDatabase.forget_email(email_id, user_id)
+            EmailDatabase.invalidate_user_cache(user_id)
+            # One folder-count refresh for the whole batch
+            EmailDatabase.schedule_folder_counts(user_id, STATUS_FOLDERS)
+        return result.count or 0
+
+    @staticmethod
+    async def mutate_many(user_id: str, patches: List[Dict[str, Any]]) -> List[str]:
+        """Apply {id, op, value} flag patches in one RPC; returns the IDs of the emails that changed"""
+        if not patches:
+            return []
+        
+        # One transaction for all patches (see migrations/011_bulk_flag_mutate.sql)
+        result = await _execute(supabase.rpc("bulk_flag_mutate", {"uid": user_id, "patches": patches}))
+        
+        # Later patches to the same email win; only the final flags matter
+        final_flags = {row["id"]: {key: row[key] for key in ("is_read", "is_starred", "status")} for row in result.data or []}
+        if final_flags:
+            try:
+                await elasticsearch_service.bulk_update_email_fields(final_flags)
+            except Exception as e:
+                print(f"Failed to update emails in Elasticsearch: {e}")
+            
+            for email_id in final_flags:
+                EmailDatabase.forget_email(email_id, user_id)
+            EmailDatabase.invalidate_user_cache(user_id)
+            
+            # One folder-count refresh for the whole batch, limited to what the ops can move
+            ops = {patch["op"] for patch in patches}
+            folders = set()
+            if "status" in ops:
+                folders.update(STATUS_FOLDERS)
+            if "star" in ops:
+                folders.add("starred")
+            if folders:
+                EmailDatabase.schedule_folder_counts(user_id, folders)
+        return list(final_flags)
+
     @staticmethod
     async def get_email_count(user_id: str, folder: str = "inbox", search: Optional[str] = None) -> int:
         """Get email count for a folder"""
@@ -606,60 +861,43 @@ class EmailDatabase:
                 print(f"Elasticsearch count failed, falling back to Supabase: {e}")
                 # Fall back to Supabase count if Elasticsearch fails
         
-        # Use Supabase for non-search queries or as fallback
-        query = supabase.table("emails").select("id", count="exact").eq("user_id", user_id)
-        
-        if folder == "inbox":
-            query = query.eq("status", EmailStatus.RECEIVED.value)
-        elif folder == "sent":
-            query = query.eq("status", EmailStatus.SENT.value)
-        elif folder == "drafts":
-            query = query.eq("status", EmailStatus.DRAFT.value)
-        elif folder == "trash":
-            query = query.eq("status", EmailStatus.TRASH.value)
-        elif folder == "starred":
-            query = query.eq("is_starred", True)
-        
-        result = query.execute()
-        return result.count or 0
+        # Folder counts are cached briefly under the user's emails:* prefix
+        redis_client = EmailDatabase.get_redis_client()
+        count_key = f"emails:{user_id}:count:{folder}"
+        if redis_client and not search:
+            try:
+                cached_count = redis_client.get(count_key)
+                if cached_count is not None:
+                    return int(cached_count)
+            except Exception as e:
+                print(f"Cache read error: {e}")
+        
+        # Use Supabase for non-search queries or as fallback (HEAD request: count only, no rows)
+        query = supabase.table("emails").select("id", count="exact", head=True).eq("user_id", user_id)
+        
+        folder_filter = _FOLDER_FILTERS.get(folder)
+        if folder_filter:
+            query = query.eq(*folder_filter)
+        
+        result = await _execute(query)
+        count = result.count or 0
+        
+        if redis_client and not search:
+            try:
+                redis_client.setex(count_key, EMAIL_COUNT_CACHE_TTL, count)
+            except Exception as e:
+                print(f"Cache write error: {e}")
+        return count
 
     @staticmethod
-    async def update_folder_counts(user_id: str) -> bool:
-        """Update email counts for all folders"""
+    async def update_folder_counts(user_id: str, folders: Optional[Iterable[str]] = None) -> bool:
+        """Update email counts for the given folders, or all folders when none are given"""
         try:
-            # Get counts for each folder
-            inbox_count = await EmailDatabase.get_email_count(user_id, "inbox")
-            sent_count = await EmailDatabase.get_email_count(user_id, "sent")
-            drafts_count = await EmailDatabase.get_email_count(user_id, "drafts")
-            trash_count = await EmailDatabase.get_email_count(user_id, "trash")
-            starred_count = await EmailDatabase.get_email_count(user_id, "starred")
-            
-            # Update email_folders table
-            # First, get the folder IDs for this user
-            folders_result = supabase.table("email_folders").select("id, name").eq("user_id", user_id).execute()
-            
-            if folders_result.data:
-                for folder in folders_result.data:
-                    folder_name = folder["name"].lower()
-                    count = 0
-                    
-                    if folder_name == "inbox":
-                        count = inbox_count
-                    elif folder_name == "sent":
-                        count = sent_count
-                    elif folder_name == "drafts":
-                        count = drafts_count
-                    elif folder_name == "trash":
-                        count = trash_count
-                    elif folder_name == "starred":
-                        count = starred_count
-                    
-                    # Update the folder count
-                    supabase.table("email_folders").update({
-                        "email_count": count,
-                        "updated_at": datetime.utcnow().isoformat()
-                    }).eq("id", folder["id"]).execute()
-            
+            # Count and update the folders in one round-trip (see migrations/010_refresh_selected_folder_counts.sql)
+            params = {"p_user_id": user_id}
+            if folders is not None:
+                params["p_folders"] = sorted(folders)
+            await _execute(supabase.rpc("refresh_folder_counts", params))
             return True
         except Exception as e:
             print(f"Error updating folder counts: {e}")
@@ -4,13 +4,12 @@ from fastapi.responses import FileResponse, StreamingResponse
 from typing import List, Optional
 from datetime import datetime
 import uuid
-import io
 import asyncio
 
 # Import models from the same directory
 from .models import (
     EmailMessage, ComposeEmailRequest, EmailListRequest, 
-    EmailListResponse, EmailStatus, EmailAddress
+    EmailListResponse, EmailStatus, EmailAddress, BulkEmailRequest, BulkMutateRequest
 )
 from .database import EmailDatabase
 from .smtp_handler import SMTPHandler
@@ -48,13 +47,20 @@ email_handler = get_email_handler()
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize Elasticsearch on startup"""
+    """Initialize Elasticsearch and warm the Supabase connection on startup"""
     try:
         await elasticsearch_service.create_index()
         print("✅ Elasticsearch index initialized")
     except Exception as e:
         print(f"⚠️  Elasticsearch initialization failed: {e}")
         print("⚠️  Search functionality will fall back to Supabase")
+    
+    # Pay the Supabase TCP/TLS setup at startup instead of on the first user request
+    try:
+        await EmailDatabase.warm_up()
+        print("✅ Supabase connection warmed up")
+    except Exception as e:
+        print(f"⚠️  Supabase warm-up failed: {e}")
 
 
 @app.get("/health")
@@ -391,9 +397,16 @@ async def get_emails(
     status: Optional[EmailStatus] = Query(None, description="Email status filter"),
     is_read: Optional[bool] = Query(None, description="Read status filter"),
     is_starred: Optional[bool] = Query(None, description="Starred status filter"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (replaces page)"),
     user_id: str = Query(..., description="User ID")
 ):
     """Get emails with filtering and pagination"""
+    if cursor:
+        try:
+            EmailDatabase.parse_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
     try:
         emails = await EmailDatabase.get_emails_from_cache_or_db(
             user_id=user_id,
@@ -403,18 +416,25 @@ async def get_emails(
             search=search,
             status=status,
             is_read=is_read,
-            is_starred=is_starred
+            is_starred=is_starred,
+            cursor=cursor
         )
         
         # Get total count for pagination
         total = await EmailDatabase.get_email_count(user_id, folder, search)
         
+        # Search results are paged by Elasticsearch, so only folder listings get a cursor
+        next_cursor = None
+        if not search and len(emails) == limit:
+            next_cursor = EmailDatabase.make_cursor(emails[-1])
+        
         return EmailListResponse(
             emails=emails,
             total=total,
             page=page,
             limit=limit,
-            has_more=(page * limit) < total
+            has_more=len(emails) == limit if cursor else (page * limit) < total,
+            next_cursor=next_cursor
         )
         
     except Exception as e:
@@ -445,6 +465,51 @@ async def get_email(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Bulk routes are declared before /emails/{email_id}/... so "bulk" is not taken as an email ID
+@app.put("/emails/bulk/read")
+async def mark_emails_read(
+    request: BulkEmailRequest,
+    is_read: bool = Query(True, description="Mark as read or unread"),
+    user_id: str = Query(..., description="User ID")
+):
+    """Mark several emails as read/unread in one update"""
+    try:
+        updated = await EmailDatabase.mark_as_read_bulk(request.email_ids, user_id, is_read)
+        return {"message": f"{updated} emails marked as {'read' if is_read else 'unread'}", "updated": updated}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/emails/bulk/delete")
+async def delete_emails(
+    request: BulkEmailRequest,
+    user_id: str = Query(..., description="User ID")
+):
+    """Move several emails to trash in one update"""
+    try:
+        deleted = await EmailDatabase.delete_emails_bulk(request.email_ids, user_id)
+        return {"message": f"{deleted} emails moved to trash", "deleted": deleted}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/emails/bulk/mutate")
+async def mutate_emails(
+    request: BulkMutateRequest,
+    user_id: str = Query(..., description="User ID")
+):
+    """Apply several read/star/status changes in one transaction"""
+    try:
+        patches = [patch.model_dump(mode="json") for patch in request.patches]
+        updated = await EmailDatabase.mutate_many(user_id, patches)
+        return {"message": f"{len(updated)} emails updated", "updated": updated}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.put("/emails/{email_id}/read")
 async def mark_email_read(
     email_id: str,
@@ -738,14 +803,14 @@ async def download_attachment(
         if not attachment:
             raise HTTPException(status_code=404, detail="Attachment not found")
         
-        # Get file content
-        content = await attachment_handler.get_attachment_content(attachment_id, user_id)
-        if not content:
+        # Open the file content as a chunked stream
+        stream = await attachment_handler.get_attachment_stream(attachment_id, user_id)
+        if stream is None:
             raise HTTPException(status_code=404, detail="Attachment file not found")
         
         # Return file as streaming response
         return StreamingResponse(
-            io.BytesIO(content),
+            stream,
             media_type=attachment["content_type"],
             headers={
                 "Content-Disposition": f"attachment; filename=\"{attachment['filename']}\"",
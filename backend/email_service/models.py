@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, EmailStr
+from typing import List, Optional, Literal, Union
+from pydantic import BaseModel, EmailStr, model_validator
 from enum import Enum
 
 
@@ -75,9 +75,35 @@ class EmailListRequest(BaseModel):
     is_starred: Optional[bool] = None
 
 
+class BulkEmailRequest(BaseModel):
+    email_ids: List[str]
+
+
+class EmailPatch(BaseModel):
+    id: str
+    op: Literal["read", "star", "status"]
+    value: Optional[Union[bool, EmailStatus]] = None  # star with no value toggles
+
+    @model_validator(mode="after")
+    def check_value_matches_op(self):
+        """Reject values the op cannot apply, so one bad patch cannot fail the whole batch"""
+        if self.op == "read" and not isinstance(self.value, bool):
+            raise ValueError("read patches need a true/false value")
+        if self.op == "star" and self.value is not None and not isinstance(self.value, bool):
+            raise ValueError("star patches take a true/false value or none to toggle")
+        if self.op == "status" and not isinstance(self.value, EmailStatus):
+            raise ValueError("status patches need an email status value")
+        return self
+
+
+class BulkMutateRequest(BaseModel):
+    patches: List[EmailPatch]
+
+
 class EmailListResponse(BaseModel):
     emails: List[EmailMessage]
     total: int
     page: int
     limit: int
-    has_more: bool 
\ No newline at end of file
+    has_more: bool
+    next_cursor: Optional[str] = None 
\ No newline at end of file
@@ -81,6 +81,9 @@ class SMTPHandler:
                         print(f"❌ Error attaching {attachment.get('filename', 'unknown')}: {e}")
                         continue
 
+            # Render once, straight to CRLF bytes, so sendmail needs no str encode or line-ending pass
+            email_content = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+
             # In development mode, use local SMTP server if available
             if settings.development_mode:
                 try:
@@ -94,7 +97,6 @@ class SMTPHandler:
                     all_recipients = to_emails + (cc_emails or []) + (bcc_emails or [])
                     
                     # Minimal debug info for performance
-                    email_content = msg.as_string()
                     print(f"📧 Sending email to {len(all_recipients)} recipients ({len(email_content)} bytes)")
                     
                     # Send the email data
@@ -142,7 +144,7 @@ class SMTPHandler:
 
             # Send email
             all_recipients = to_emails + (cc_emails or []) + (bcc_emails or [])
-            server.sendmail(from_email, all_recipients, msg.as_string())
+            server.sendmail(from_email, all_recipients, email_content)
             server.quit()
 
             return True
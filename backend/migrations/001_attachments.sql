@@ -0,0 +1,14 @@
+-- Attachment metadata, written by AttachmentHandler.save_attachment so that
+-- get_attachment is a single primary-key lookup instead of an S3 list/head
+-- or a directory scan.
+CREATE TABLE IF NOT EXISTS attachments (
+    id UUID PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    stored_filename TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    size BIGINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_attachments_user_id ON attachments(user_id);
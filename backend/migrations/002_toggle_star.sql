@@ -0,0 +1,13 @@
+-- Flips is_starred in a single UPDATE so EmailDatabase.toggle_star needs one
+-- round-trip instead of a read followed by a write, and concurrent toggles
+-- cannot overwrite each other.
+CREATE OR REPLACE FUNCTION toggle_star(p_email_id UUID, p_user_id UUID)
+RETURNS SETOF emails
+LANGUAGE sql
+AS $$
+    UPDATE emails
+    SET is_starred = NOT is_starred,
+        updated_at = NOW()
+    WHERE id = p_email_id AND user_id = p_user_id
+    RETURNING *;
+$$;
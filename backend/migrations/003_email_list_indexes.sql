@@ -0,0 +1,8 @@
+-- Serve EmailDatabase.get_emails / get_email_count straight from an index:
+-- folder views filter on (user_id, status) and the starred view on
+-- (user_id, is_starred), both ordered by created_at DESC.
+CREATE INDEX IF NOT EXISTS idx_emails_user_status_created
+    ON emails (user_id, status, created_at DESC) INCLUDE (is_read, is_starred);
+
+CREATE INDEX IF NOT EXISTS idx_emails_user_starred_created
+    ON emails (user_id, is_starred, created_at DESC);
@@ -0,0 +1,9 @@
+-- Full-text search column for the Supabase fallback in EmailDatabase.get_emails,
+-- replacing leading-wildcard ILIKE filters that no index can serve.
+ALTER TABLE emails
+    ADD COLUMN IF NOT EXISTS search_vec tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('simple', coalesce(subject, '') || ' ' || coalesce(body, ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_emails_search_vec ON emails USING GIN (search_vec);
@@ -0,0 +1,30 @@
+-- Recomputes every folder badge for a user in one statement, so
+-- EmailDatabase.update_folder_counts is a single RPC instead of five
+-- COUNT queries plus one UPDATE per folder row.
+CREATE OR REPLACE FUNCTION refresh_folder_counts(p_user_id UUID)
+RETURNS void
+LANGUAGE sql
+AS $$
+    WITH counts AS (
+        SELECT
+            count(*) FILTER (WHERE status = 'received') AS inbox,
+            count(*) FILTER (WHERE status = 'sent') AS sent,
+            count(*) FILTER (WHERE status = 'draft') AS drafts,
+            count(*) FILTER (WHERE status = 'trash') AS trash,
+            count(*) FILTER (WHERE is_starred) AS starred
+        FROM emails
+        WHERE user_id = p_user_id
+    )
+    UPDATE email_folders f
+    SET email_count = CASE lower(f.name)
+            WHEN 'inbox' THEN c.inbox
+            WHEN 'sent' THEN c.sent
+            WHEN 'drafts' THEN c.drafts
+            WHEN 'trash' THEN c.trash
+            WHEN 'starred' THEN c.starred
+            ELSE 0
+        END,
+        updated_at = NOW()
+    FROM counts c
+    WHERE f.user_id = p_user_id;
+$$;
@@ -0,0 +1,18 @@
+-- Let Postgres stamp updated_at on every emails UPDATE, so the
+-- EmailDatabase update paths no longer send a client-side timestamp.
+ALTER TABLE emails ALTER COLUMN updated_at SET DEFAULT NOW();
+
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS emails_set_updated_at ON emails;
+CREATE TRIGGER emails_set_updated_at
+    BEFORE UPDATE ON emails
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
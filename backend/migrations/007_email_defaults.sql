@@ -0,0 +1,7 @@
+-- Let Postgres assign ids and timestamps for new emails, so
+-- EmailDatabase.create_email / create_emails no longer send them and
+-- created_at (the list ordering key) always comes from server time.
+ALTER TABLE emails
+    ALTER COLUMN id SET DEFAULT gen_random_uuid(),
+    ALTER COLUMN created_at SET DEFAULT NOW(),
+    ALTER COLUMN updated_at SET DEFAULT NOW();
@@ -0,0 +1,11 @@
+-- The starred view only ever reads is_starred = true rows, a small slice
+-- of each mailbox. A partial index holds just those rows (ordered the way
+-- EmailDatabase.get_emails pages them) and replaces the full-table
+-- (user_id, is_starred, created_at) index from 003. Status folders stay on
+-- idx_emails_user_status_created, whose leading (user_id, status) columns
+-- already confine each folder to its own index range.
+CREATE INDEX IF NOT EXISTS idx_emails_starred_created
+    ON emails (user_id, created_at DESC, id DESC)
+    WHERE is_starred;
+
+DROP INDEX IF EXISTS idx_emails_user_starred_created;
@@ -0,0 +1,16 @@
+-- toggle_star used to return the whole emails row (body, html_body,
+-- attachments) although EmailDatabase.toggle_star only needs the new flag
+-- to patch the search index. The return type changes, so the function is
+-- dropped and recreated.
+DROP FUNCTION IF EXISTS toggle_star(UUID, UUID);
+
+CREATE FUNCTION toggle_star(p_email_id UUID, p_user_id UUID)
+RETURNS TABLE (is_starred BOOLEAN)
+LANGUAGE sql
+AS $$
+    UPDATE emails
+    SET is_starred = NOT emails.is_starred,
+        updated_at = NOW()
+    WHERE id = p_email_id AND user_id = p_user_id
+    RETURNING emails.is_starred;
+$$;
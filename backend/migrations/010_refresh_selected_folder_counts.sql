@@ -0,0 +1,35 @@
+-- Lets EmailDatabase.update_folder_counts refresh only the folders a
+-- mutation can affect (e.g. just 'starred' after a star toggle).
+-- p_folders NULL keeps the old behaviour of refreshing every folder.
+-- The signature changes, so the 005 version is dropped first to keep
+-- the RPC name unambiguous for PostgREST.
+DROP FUNCTION IF EXISTS refresh_folder_counts(UUID);
+
+CREATE OR REPLACE FUNCTION refresh_folder_counts(p_user_id UUID, p_folders TEXT[] DEFAULT NULL)
+RETURNS void
+LANGUAGE sql
+AS $$
+    WITH counts AS (
+        SELECT
+            count(*) FILTER (WHERE status = 'received') AS inbox,
+            count(*) FILTER (WHERE status = 'sent') AS sent,
+            count(*) FILTER (WHERE status = 'draft') AS drafts,
+            count(*) FILTER (WHERE status = 'trash') AS trash,
+            count(*) FILTER (WHERE is_starred) AS starred
+        FROM emails
+        WHERE user_id = p_user_id
+    )
+    UPDATE email_folders f
+    SET email_count = CASE lower(f.name)
+            WHEN 'inbox' THEN c.inbox
+            WHEN 'sent' THEN c.sent
+            WHEN 'drafts' THEN c.drafts
+            WHEN 'trash' THEN c.trash
+            WHEN 'starred' THEN c.starred
+            ELSE 0
+        END,
+        updated_at = NOW()
+    FROM counts c
+    WHERE f.user_id = p_user_id
+      AND (p_folders IS NULL OR lower(f.name) = ANY(p_folders));
+$$;
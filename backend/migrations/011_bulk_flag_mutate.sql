@@ -0,0 +1,46 @@
+-- Applies a batch of flag changes for one user in a single transaction, so
+-- EmailDatabase.mutate_many replaces one HTTP call per email/action with one
+-- RPC. patches is a JSON array of {id, op, value} where op is
+--   'read'   -> is_read = value
+--   'star'   -> is_starred = value (toggles when value is null)
+--   'status' -> status = value
+-- read and status patches without a value are rejected rather than writing NULL.
+-- Returns the final flags of every row a patch touched (a row patched more
+-- than once appears once per patch, last row wins).
+CREATE OR REPLACE FUNCTION bulk_flag_mutate(uid UUID, patches JSONB)
+RETURNS TABLE (id UUID, is_read BOOLEAN, is_starred BOOLEAN, status TEXT)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    patch JSONB;
+BEGIN
+    FOR patch IN SELECT * FROM jsonb_array_elements(patches) LOOP
+        CASE patch->>'op'
+            WHEN 'read' THEN
+                IF patch->'value' IS NULL OR jsonb_typeof(patch->'value') <> 'boolean' THEN
+                    RAISE EXCEPTION 'bulk_flag_mutate: read patch for % needs a boolean value', patch->>'id';
+                END IF;
+                RETURN QUERY
+                UPDATE emails e SET is_read = (patch->>'value')::BOOLEAN
+                WHERE e.id = (patch->>'id')::UUID AND e.user_id = uid
+                RETURNING e.id, e.is_read, e.is_starred, e.status::TEXT;
+            WHEN 'star' THEN
+                RETURN QUERY
+                UPDATE emails e SET is_starred = COALESCE((patch->>'value')::BOOLEAN, NOT e.is_starred)
+                WHERE e.id = (patch->>'id')::UUID AND e.user_id = uid
+                RETURNING e.id, e.is_read, e.is_starred, e.status::TEXT;
+            WHEN 'status' THEN
+                IF patch->'value' IS NULL OR jsonb_typeof(patch->'value') <> 'string' THEN
+                    RAISE EXCEPTION 'bulk_flag_mutate: status patch for % needs a status value', patch->>'id';
+                END IF;
+                RETURN QUERY
+                UPDATE emails e SET status = patch->>'value'
+                WHERE e.id = (patch->>'id')::UUID AND e.user_id = uid
+                RETURNING e.id, e.is_read, e.is_starred, e.status::TEXT;
+            ELSE
+                RAISE EXCEPTION 'bulk_flag_mutate: unknown op %', patch->>'op';
+        END CASE;
+    END LOOP;
+END;
+$$;
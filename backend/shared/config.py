@@ -2,7 +2,6 @@ from pydantic_settings import BaseSettings
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 import os
-import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 import logging
 
@@ -13,6 +12,8 @@ class Settings(BaseSettings):
     SUPABASE_URL: Optional[str] = os.getenv('SUPABASE_URL')
     SUPABASE_KEY: Optional[str] = os.getenv('SUPABASE_KEY')
     SUPABASE_SERVICE_KEY: Optional[str] = os.getenv('SUPABASE_SERVICE_KEY')
+    # Direct Postgres DSN for latency-sensitive lookups (asyncpg); optional
+    SUPABASE_DB_URL: Optional[str] = os.getenv('SUPABASE_DB_URL')
     
     # Redis
     REDIS_URL: Optional[str] = os.getenv('REDIS_URL', 'redis://localhost:6379')
@@ -41,6 +42,7 @@ class Settings(BaseSettings):
     smtp_receive_port: int = int(os.getenv('SMTP_RECEIVE_PORT', '2525'))
     smtp_receive_use_ssl: bool = os.getenv('SMTP_RECEIVE_USE_SSL', 'false').lower() == 'true'
     smtp_receive_ssl_port: int = int(os.getenv('SMTP_RECEIVE_SSL_PORT', '465'))
+    smtp_max_message_bytes: int = int(os.getenv('SMTP_MAX_MESSAGE_BYTES', str(35 * 1024 * 1024)))
     
     # AWS Configuration
     AWS_ACCESS_KEY_ID: Optional[str] = os.getenv('AWS_ACCESS_KEY_ID')
@@ -80,20 +82,27 @@ class Settings(BaseSettings):
         env_file = ".env"
         extra = "ignore"
     
-    def get_ses_client(self) -> boto3.client:
+    def get_ses_client(self):
         """Get configured SES client"""
+        # Imported here so processes that never talk to SES don't pay for loading boto3
+        import boto3
+        from botocore.config import Config
+        
         logger = logging.getLogger(__name__)
+        # Larger keep-alive pool so concurrent SES API sends don't queue or churn connections
+        ses_config = Config(max_pool_connections=50, retries={'max_attempts': 3})
         try:
             if self.AWS_ACCESS_KEY_ID and self.AWS_SECRET_ACCESS_KEY:
                 return boto3.client(
                     'ses',
                     region_name=self.AWS_REGION,
                     aws_access_key_id=self.AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=self.AWS_SECRET_ACCESS_KEY
+                    aws_secret_access_key=self.AWS_SECRET_ACCESS_KEY,
+                    config=ses_config
                 )
             else:
                 # Use default credentials (IAM role, environment, etc.)
-                return boto3.client('ses', region_name=self.AWS_REGION)
+                return boto3.client('ses', region_name=self.AWS_REGION, config=ses_config)
         except NoCredentialsError:
             logger.error("AWS credentials not found. Please configure AWS credentials.")
             raise
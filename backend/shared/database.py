@@ -1,8 +1,10 @@
+import functools
 from supabase import create_client, Client
 from shared.config import settings
 import os
 
-# Initialize Supabase client
+# Initialize Supabase client (one per process, so callers share its HTTP keep-alive pool)
+@functools.lru_cache(maxsize=1)
 def get_supabase():
     # Check if Supabase credentials are properly configured
     if (settings.SUPABASE_URL == "your-supabase-url" or 
@@ -146,6 +146,14 @@ class ElasticsearchService:
         except Exception as e:
             logger.error(f"Error updating indexed email {email_id}: {e}")
     
+    async def update_email_fields(self, email_id: str, fields: Dict[str, Any]):
+        """Apply a partial update (e.g. a flag change) to an indexed email document"""
+        try:
+            self.client.update(index=self.index_name, id=email_id, body={"doc": fields})
+            logger.debug(f"Updated fields {list(fields)} on indexed email: {email_id}")
+        except Exception as e:
+            logger.error(f"Error updating indexed email {email_id}: {e}")
+    
     async def delete_email(self, email_id: str):
         """Delete an email document from the index"""
         try:
@@ -288,5 +296,20 @@ class ElasticsearchService:
         except Exception as e:
             logger.error(f"Error bulk indexing emails: {e}")
 
+    async def bulk_update_email_fields(self, updates: Dict[str, Dict[str, Any]]):
+        """Apply partial updates to many indexed emails; updates maps email ID -> changed fields"""
+        try:
+            actions = [
+                {"_op_type": "update", "_index": self.index_name, "_id": email_id, "doc": fields}
+                for email_id, fields in updates.items()
+            ]
+            
+            if actions:
+                from elasticsearch.helpers import bulk
+                bulk(self.client, actions)
+                logger.info(f"Bulk updated {len(actions)} emails")
+        except Exception as e:
+            logger.error(f"Error bulk updating emails: {e}")
+
 # Global instance
 elasticsearch_service = ElasticsearchService()